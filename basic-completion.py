@@ -1,14 +1,6 @@
-import os
 import time
-import litellm
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Set API keys
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-os.environ["ANTHROPIC_API_KEY"] = os.getenv("ANTHROPIC_API_KEY")
+import asyncio
+import harness
 
 # Define models to test
 models = [
@@ -16,8 +8,11 @@ models = [
     "claude-3-5-sonnet-latest"
 ]
 
+# User message for basic completion test
+user_message = "What is the capital of France? Answer in one word."
+
 # Function to test basic completion
-def test_basic_completion(model):
+async def test_basic_completion(model, **params):
     """Test basic completion for a given model"""
     print(f"\n=== Testing Basic Completion for {model} ===")
     
@@ -25,12 +20,13 @@ def test_basic_completion(model):
         # Measure time manually
         start_time = time.time()
         
-        response = litellm.completion(
+        response = await harness.acompletion(
             model=model,
             messages=[{
                 "role": "user",
-                "content": "What is the capital of France? Answer in one word."
-            }]
+                "content": user_message
+            }],
+            **params
         )
         
         end_time = time.time()
@@ -38,11 +34,18 @@ def test_basic_completion(model):
         print(f"Response: {response.choices[0].message.content}")
         print(f"Time taken: {end_time - start_time:.2f} seconds")
         print("Test passed successfully!")
+        return {"ok": True, "latency": end_time - start_time}
         
     except Exception as e:
         print(f"Error testing {model}: {str(e)}")
+        return {"ok": False, "error": str(e), "error_type": type(e).__name__}
 
 # Run test for each model
-if __name__ == "__main__":
+async def main():
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
     for model in models:
-        test_basic_completion(model)
\ No newline at end of file
+        await test_basic_completion(model)
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
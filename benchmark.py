@@ -0,0 +1,160 @@
+"""
+Benchmark mode: repeat each test per model and report latency statistics.
+
+Every round runs all (test, model) pairs through the harness, and rounds
+run one after another. Within a round at most --concurrency requests are in
+flight per provider. The default of 1 sends one request at a time to each
+provider, so a test's latency doesn't include others queued at the same
+model. Raising it runs a round faster, but the tests then share the
+provider. Warmup rounds are run first and discarded.
+
+    python benchmark.py --iterations 20 --warmup 2
+    python benchmark.py basic_completion --baseline results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import cost
+import harness
+import http_pool
+import results
+import stream_consumer
+from latency import LatencyStore
+
+# Tests benchmarked when none are given
+DEFAULT_TESTS = ["basic_completion", "system_message", "long_context"]
+
+# Statistics compared against the baseline
+COMPARED_STATS = ["mean", "p50", "p90"]
+
+# In-flight requests per provider within a round, unless --concurrency is given
+DEFAULT_CONCURRENCY = 1
+
+
+# Function to run warmup and measured rounds for every job
+async def run_benchmark(jobs, iterations, warmup, concurrency=DEFAULT_CONCURRENCY):
+    """Return {(test, model): (LatencyStore, error count)} for the measured rounds"""
+    stores = {job: LatencyStore() for job in jobs}
+    errors = {job: 0 for job in jobs}
+
+    for round_number in range(warmup + iterations):
+        measured = round_number >= warmup
+        label = f"iteration {round_number - warmup + 1}/{iterations}" if measured else f"warmup {round_number + 1}/{warmup}"
+        print(f"Running {label}...", flush=True)
+
+        for result in await harness.run_matrix(jobs, concurrency, echo=False):
+            job = (result["test"], result["model"])
+            if not measured:
+                continue
+            if result["ok"]:
+                stores[job].add(result.get("latency", result["wall_time"]))
+            else:
+                errors[job] += 1
+
+    return {job: (stores[job], errors[job]) for job in jobs}
+
+
+# Function to turn the collected samples into a JSON-friendly report
+def build_report(measurements, iterations, warmup):
+    entries = []
+    for (test_name, model), (store, error_count) in measurements.items():
+        entry = {"test": test_name, "model": model, "errors": error_count}
+        entry.update(store.stats())
+        entry["samples"] = list(store.samples)
+        entries.append(entry)
+    return {"run_id": results.RUN_ID, "iterations": iterations, "warmup": warmup, "results": entries}
+
+
+# Function to flag statistics that got slower than the baseline
+def compare(report, baseline, threshold):
+    """Return (test, model, stat, baseline value, current value) for each regression"""
+    previous = {(e["test"], e["model"]): e for e in baseline["results"]}
+    regressions = []
+    for entry in report["results"]:
+        old = previous.get((entry["test"], entry["model"]))
+        if not old:
+            continue
+        for stat in COMPARED_STATS:
+            if old.get(stat) and entry.get(stat) and entry[stat] > old[stat] * (1 + threshold):
+                regressions.append((entry["test"], entry["model"], stat, old[stat], entry[stat]))
+    return regressions
+
+
+# Function to print the statistics table
+def print_report(report):
+    print(f"\n=== Benchmark results ({report['iterations']} iterations, {report['warmup']} warmup) ===")
+    print(f"{'test':<22} {'model':<40} {'n':>4} {'err':>4} {'mean':>7} {'stddev':>7} "
+          f"{'p50':>7} {'p90':>7} {'p99':>7} {'req/s':>6}")
+    for e in sorted(report["results"], key=lambda e: (e["test"], e["model"])):
+        if not e["count"]:
+            print(f"{e['test']:<22} {e['model']:<40} {0:>4} {e['errors']:>4}  (no successful runs)")
+            continue
+        print(f"{e['test']:<22} {e['model']:<40} {e['count']:>4} {e['errors']:>4} {e['mean']:>7.3f} "
+              f"{e['stddev']:>7.3f} {e['p50']:>7.3f} {e['p90']:>7.3f} {e['p99']:>7.3f} "
+              f"{e['throughput_rps']:>6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LiteLLM tests over repeated runs")
+    parser.add_argument("tests", nargs="*", help=f"Tests to benchmark (default: {', '.join(DEFAULT_TESTS)})")
+    parser.add_argument("--models", nargs="+", help="Models to test instead of each script's models list")
+    parser.add_argument("--iterations", type=int, default=10, help="Measured runs per model")
+    parser.add_argument("--warmup", type=int, default=1, help="Discarded runs before measuring")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="In-flight requests allowed per provider within a round "
+                             f"(default: {DEFAULT_CONCURRENCY}, so tests don't overlap)")
+    parser.add_argument("--output", help="Where to write the JSON report (default: results/benchmark-<run id>.json)")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown that counts as a regression (default: 0.2 = 20%%)")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 where the provider supports it (needs h2)")
+    parser.add_argument("--no-keepalive", action="store_true",
+                        help="Open a new connection for every request, to measure the handshake overhead")
+    args = parser.parse_args()
+    for test_name in args.tests:
+        if test_name not in harness.TESTS:
+            parser.error(f"unknown test: {test_name}")
+    if args.http2 and not http_pool.http2_available():
+        parser.error("--http2 needs the h2 package: pip install 'httpx[http2]'")
+    http_pool.configure(use_http2=args.http2, keep_alive=not args.no_keepalive, in_flight=args.concurrency)
+
+    jobs = harness.build_jobs(args.tests or DEFAULT_TESTS, args.models)
+    # Streamed text isn't shown while benchmarking, so don't spend time printing it
+    stream_consumer.set_echo("off")
+
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
+    start_time = time.time()
+    measurements = asyncio.run(run_benchmark(jobs, args.iterations, args.warmup, args.concurrency))
+    end_time = time.time()
+
+    report = build_report(measurements, args.iterations, args.warmup)
+    report["wall_time"] = end_time - start_time
+    print_report(report)
+
+    output = args.output or os.path.join(results.RESULTS_DIR, f"benchmark-{results.RUN_ID}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    cost.print_summary()
+    http_pool.print_summary()
+    print(f"\nReport written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n=== Regressions vs {args.baseline} ===")
+            for test_name, model, stat, old, new in regressions:
+                print(f"{test_name:<22} {model:<40} {stat:<5} {old:.3f}s -> {new:.3f}s (+{(new / old - 1) * 100:.0f}%)")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Environment and API keys shared by every test script.
+
+load_env() reads .env once per process. API keys are only read from the
+environment, never written back, so a missing key stays missing and
+litellm reports it, instead of the key being set to an empty string.
+missing_keys() lets run-tests.py check every provider's key up front.
+"""
+import os
+
+# Environment variable holding each provider's API key
+PROVIDER_KEYS = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+    "groq": "GROQ_API_KEY",
+    "mistral": "MISTRAL_API_KEY",
+    "deepseek": "DEEPSEEK_API_KEY",
+}
+
+_env_loaded = False
+
+
+# Function to load environment variables from .env (once)
+def load_env():
+    global _env_loaded
+    if not _env_loaded:
+        # python-dotenv is imported here so listing tests doesn't pay for it
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+# Function to find providers whose API key isn't set
+def missing_keys(providers):
+    """Return {provider: variable} for each provider whose key is unset or empty"""
+    load_env()
+    return {provider: PROVIDER_KEYS[provider] for provider in sorted(set(providers))
+            if provider in PROVIDER_KEYS and not os.getenv(PROVIDER_KEYS[provider])}
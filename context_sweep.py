@@ -0,0 +1,182 @@
+"""
+Context-length sweep: latency against prompt size for each model.
+
+Prompts built from docs/llm.txt at growing token counts are streamed to
+each model, recording time to first token and total latency at every
+point. The sizes double from --start until a request is rejected for being
+too long (or --max-tokens is reached). The context limit is then narrowed
+down by bisection instead of relying on a single failed full-size call.
+
+    python context_sweep.py --start 1k --max-tokens 256k
+    python context_sweep.py --models mock/openai/small-context --resolution 500
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+
+import cost
+import harness
+import long_context
+import results
+from latency import StreamTimer
+from stream_consumer import StreamConsumer
+
+# Source text for the prompts
+LONG_TEXT_PATH = "docs/llm.txt"
+
+# Models swept when none are given (same as long-context-test.py)
+DEFAULT_MODELS = [
+    "openai/gpt-4o",
+    "anthropic/claude-3-5-sonnet-latest"
+]
+
+
+# Function to recognise "prompt too long" errors
+def is_context_error(error):
+    if type(error).__name__ == "ContextWindowExceededError":
+        return True
+    message = str(error).lower()
+    return any(text in message for text in ("maximum context length", "context_length_exceeded",
+                                             "prompt is too long", "context window"))
+
+
+# Function to stream one prompt of a given size and time it
+async def measure(model, target_tokens, max_tokens):
+    """Return one curve point: tokens, ok, ttft_ms, total_ms and any error"""
+    point = {"model": model, "tokens": target_tokens}
+    try:
+        prompt = await asyncio.to_thread(long_context.build_prompt, model, LONG_TEXT_PATH, target_tokens)
+        timer = StreamTimer()
+        timer.start()
+        response = await harness.acompletion(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            stream_options={"include_usage": True},
+            max_tokens=max_tokens
+        )
+        stats = (await StreamConsumer(timer, echo="off").consume(response)).stats
+        point.update(ok=True, ttft_ms=stats["ttft_ms"], total_ms=stats["total_ms"])
+    except Exception as e:
+        point.update(ok=False, context_exceeded=is_context_error(e), error=str(e)[:300])
+    status = f"ttft {point['ttft_ms']:.0f} ms, total {point['total_ms']:.0f} ms" if point["ok"] else \
+        ("context limit exceeded" if point["context_exceeded"] else f"error: {point['error'][:80]}")
+    print(f"{model:<40} {target_tokens:>8} tokens  {status}", flush=True)
+    return point
+
+
+# Function to sweep one model and bisect its context limit
+async def sweep_model(model, start, max_tokens, resolution, output_tokens):
+    """
+    Double the prompt size from start until a context error or max_tokens,
+    then bisect between the last size that worked and the first that was
+    rejected until they are within resolution tokens of each other.
+    """
+    points = []
+    ok_size, failed_size = None, None
+    size = start
+    while size <= max_tokens:
+        point = await measure(model, size, output_tokens)
+        points.append(point)
+        if point["ok"]:
+            ok_size = size
+        elif point["context_exceeded"]:
+            failed_size = size
+            break
+        else:
+            return {"points": points, "context_limit": None, "error": point["error"]}
+        if size == max_tokens:
+            break
+        size = min(size * 2, max_tokens)
+
+    if failed_size is not None:
+        low = ok_size or 0
+        while failed_size - low > resolution:
+            middle = (low + failed_size) // 2
+            point = await measure(model, middle, output_tokens)
+            points.append(point)
+            if point["ok"]:
+                low = middle
+            elif point["context_exceeded"]:
+                failed_size = middle
+            else:
+                break
+        ok_size = low or None
+
+    points.sort(key=lambda p: p["tokens"])
+    return {"points": points, "context_limit": ok_size if failed_size else None,
+            "largest_ok": ok_size, "smallest_rejected": failed_size}
+
+
+# Function to find the largest prompt worth trying for a model
+def default_max_tokens(model, fallback):
+    # Already imported by harness.prepare() in main()
+    import litellm
+    try:
+        return litellm.get_model_info(model)["max_input_tokens"] or fallback
+    except Exception:
+        return fallback
+
+
+async def run_sweep(models, start, max_tokens, resolution, output_tokens):
+    sweeps = await asyncio.gather(*(
+        sweep_model(model, start, max_tokens or default_max_tokens(model, 200_000), resolution, output_tokens)
+        for model in models
+    ))
+    return dict(zip(models, sweeps))
+
+
+# Function to write the curves as CSV and JSON
+def write_results(curves, prefix):
+    csv_path = f"{prefix}.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["model", "tokens", "ok", "ttft_ms", "total_ms", "error"])
+        for model, curve in curves.items():
+            for p in curve["points"]:
+                writer.writerow([model, p["tokens"], p["ok"], p.get("ttft_ms"), p.get("total_ms"), p.get("error", "")])
+    json_path = f"{prefix}.json"
+    with open(json_path, "w", encoding="utf-8") as file:
+        json.dump({"run_id": results.RUN_ID, "models": curves}, file, indent=2)
+    return csv_path, json_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep latency against prompt size for each model")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, help="Models to sweep")
+    parser.add_argument("--start", type=long_context.parse_size, default=1000, help="First prompt size (default: 1k)")
+    parser.add_argument("--max-tokens", type=long_context.parse_size,
+                        help="Largest prompt size (default: the model's max_input_tokens, or 200k)")
+    parser.add_argument("--resolution", type=long_context.parse_size, default=1000,
+                        help="Stop bisecting the context limit once within this many tokens")
+    parser.add_argument("--output-tokens", type=int, default=20, help="max_tokens for each response")
+    parser.add_argument("--output", help="Output path without extension (default: results/context-sweep-<run id>)")
+    parser.add_argument("--budget", type=float, metavar="USD",
+                        help="Stop sending prompts once this much has been spent (priced by litellm)")
+    args = parser.parse_args()
+    cost.set_budget(args.budget)
+
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
+    curves = asyncio.run(run_sweep(args.models, args.start, args.max_tokens, args.resolution, args.output_tokens))
+
+    print("\n=== Context limits ===")
+    for model, curve in curves.items():
+        if curve.get("smallest_rejected"):
+            print(f"{model:<40} between {curve['largest_ok'] or 0} and {curve['smallest_rejected']} tokens")
+        elif curve.get("error"):
+            print(f"{model:<40} sweep stopped: {curve['error'][:80]}")
+        else:
+            print(f"{model:<40} no limit hit up to {curve['largest_ok']} tokens")
+
+    os.makedirs(results.RESULTS_DIR, exist_ok=True)
+    prefix = args.output or os.path.join(results.RESULTS_DIR, f"context-sweep-{results.RUN_ID}")
+    csv_path, json_path = write_results(curves, prefix)
+    cost.print_summary()
+    print(f"\nCurves written to {csv_path} and {json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Token and cost accounting for every model call, with an optional budget.
+
+harness.acompletion() passes each response's usage to add_usage(), which
+prices it with litellm's cost map (cached prompt tokens at the cached rate)
+and adds tokens, cost and call time to a running total per model. When a
+budget is set, check_budget() raises BudgetExceededError before any new
+call once the spend has reached it, so load runs and sweeps stop
+scheduling requests instead of running up the bill.
+
+Mock models are priced like a small real model of their wire format, so
+budgets can be tried out offline.
+"""
+import threading
+
+# Models mock models are priced as, by wire format
+MOCK_PRICING = {"openai": "gpt-4o-mini", "anthropic": "anthropic/claude-haiku-4-5"}
+
+_lock = threading.Lock()
+totals = {}
+spent = 0.0
+budget = None
+refused = 0
+
+
+class BudgetExceededError(Exception):
+    """Raised instead of making a call once the run's budget has been spent"""
+
+
+# Function to set (or with None, remove) the spending limit for this run
+def set_budget(usd):
+    global budget
+    budget = usd
+
+
+# Function to stop new calls once the budget is spent
+def check_budget():
+    global refused
+    if budget is not None and spent >= budget:
+        refused += 1
+        raise BudgetExceededError(f"Budget of ${budget:.4f} spent (${spent:.4f}); not sending more requests")
+
+
+def budget_exceeded():
+    return budget is not None and spent >= budget
+
+
+# Function to pick the model name litellm's cost map knows a model by
+def pricing_model(model):
+    if model.startswith("mock/"):
+        return MOCK_PRICING.get(model.split("/")[1], model)
+    return model
+
+
+# Function to price one call's usage
+def call_cost(model, usage):
+    """Return the cost in USD of usage for model, or None if litellm has no price for it"""
+    import litellm
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(model=pricing_model(model), usage_object=usage)
+    except Exception:
+        return None
+    return prompt_cost + completion_cost
+
+
+# Function to read the cached-prompt token counts from a usage block
+def cache_tokens(usage):
+    """Return (tokens read from the prompt cache, tokens written to it)"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    read = getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", None) or 0
+    written = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return read, written
+
+
+# Function to add one call's usage to the totals
+def add_usage(model, usage, seconds):
+    """Record usage for model and return a dict of its tokens and cost"""
+    global spent
+    cached, cache_written = cache_tokens(usage)
+    call = {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": cached,
+        "cache_creation_tokens": cache_written,
+        "cost": call_cost(model, usage),
+    }
+    with _lock:
+        entry = totals.setdefault(model, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                          "cached_tokens": 0, "cache_creation_tokens": 0, "cost": 0.0,
+                                          "unpriced": 0, "seconds": 0.0})
+        entry["requests"] += 1
+        entry["seconds"] += seconds
+        for field in ("prompt_tokens", "completion_tokens", "cached_tokens", "cache_creation_tokens"):
+            entry[field] += call[field]
+        if call["cost"] is None:
+            entry["unpriced"] += 1
+        else:
+            entry["cost"] += call["cost"]
+            spent += call["cost"]
+    return call
+
+
+# Function to print tokens, throughput and cost per model
+def print_summary():
+    if not totals:
+        return
+    print("\n=== Tokens and cost ===")
+    print(f"{'model':<40} {'calls':>6} {'prompt':>9} {'cached':>8} {'output':>8} {'tok/s':>7} "
+          f"{'cost $':>9} {'$/1k calls':>10}")
+    for model, t in sorted(totals.items()):
+        tokens_per_sec = t["completion_tokens"] / t["seconds"] if t["seconds"] else 0.0
+        per_thousand = t["cost"] / t["requests"] * 1000 if t["requests"] else 0.0
+        note = f"  ({t['unpriced']} unpriced)" if t["unpriced"] else ""
+        print(f"{model:<40} {t['requests']:>6} {t['prompt_tokens']:>9} {t['cached_tokens']:>8} "
+              f"{t['completion_tokens']:>8} {tokens_per_sec:>7.1f} {t['cost']:>9.4f} {per_thousand:>10.3f}{note}")
+    line = f"Total spent: ${spent:.4f}"
+    if budget is not None:
+        line += f" of ${budget:.4f} budget"
+    if refused:
+        line += f"; {refused} requests not sent after the budget ran out"
+    print(line)
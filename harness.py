@@ -0,0 +1,320 @@
+"""
+Shared helpers for running the LiteLLM test scripts together.
+
+The test scripts use hyphenated file names, so they can't be imported with a
+plain import statement. load_script() loads them by path, and run_matrix()
+runs every selected test against every model concurrently on one event loop.
+
+litellm takes seconds to import, so it is only imported by prepare(), which
+every entry point calls once before it starts timing anything. Listing the
+tests and their models never imports it.
+"""
+import asyncio
+import contextlib
+import contextvars
+import importlib.util
+import io
+import json
+import os
+import sys
+import time
+
+import config
+import cost
+import http_pool
+import metrics
+import profiler
+import response_cache
+import retry
+
+# Directory that holds the test scripts
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Test name -> (script file, async test function)
+TESTS = {
+    "basic_completion": ("basic-completion.py", "test_basic_completion"),
+    "system_message": ("system-message-test.py", "test_system_message"),
+    "long_context": ("long-context-test.py", "test_long_context"),
+    "streaming": ("streaming-test.py", "test_streaming"),
+    "tool_calling": ("tool-calling-test.py", "test_tool_calling"),
+    "streaming_tool_calling": ("tool-calling-test.py", "test_streaming_tool_calling"),
+    "image_input": ("image-input-test.py", "test_image_input"),
+}
+
+# Default number of in-flight requests allowed per provider
+DEFAULT_CONCURRENCY = 4
+
+_scripts = {}
+
+# Buffer that print() output of the current job is redirected to
+_output = contextvars.ContextVar("harness_output", default=None)
+
+# Counters collected while the current job runs (see run_job)
+_job_stats = contextvars.ContextVar("harness_job_stats", default=None)
+
+# Token counts summed into the job's counters from response.usage
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens", "cache_creation_tokens")
+
+
+class _JobStdout:
+    """Send print() output to the running job's buffer, if it has one"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        buffer = _output.get()
+        if buffer is None:
+            return self._stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if _output.get() is None:
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+# Function to get everything loaded before the first timed call
+def prepare():
+    """Load .env and import litellm (once), so neither is paid for inside a measurement"""
+    config.load_env()
+    import litellm
+    return litellm
+
+
+# Function every test uses to call the model
+async def acompletion(model, **kwargs):
+    """
+    Call litellm.acompletion for model.
+
+    Models named "mock/<wire format>/<profile>" are sent to the local mock
+    provider instead of a real API (see mock_provider.py). Retries, rate
+    limits and circuit breaking are applied per provider by retry.py,
+    responses come from response_cache.py when the cache is enabled,
+    each call's tokens and cost are added up by cost.py, and connections
+    are pooled and timed by http_pool.py.
+    """
+    if not response_cache.enabled:
+        return await _call_model(model, kwargs)
+
+    key = response_cache.make_key(model, kwargs)
+    cached = response_cache.get(key)
+    if cached is not None:
+        stats = _job_stats.get()
+        if stats is not None:
+            stats["cache_hits"] += 1
+        return cached
+    started_ns = time.perf_counter_ns()
+    response = await _call_model(model, kwargs)
+    return response_cache.put(key, response, started_ns)
+
+
+async def _call_model(model, kwargs):
+    provider = provider_of(model)
+    if model.startswith("mock/"):
+        import mock_provider
+        kwargs.update(mock_provider.model_kwargs(model))
+        wire_format = model.split("/")[1]
+    else:
+        kwargs["model"] = model
+        wire_format = provider
+    # Retries are handled by the retry module, not by the provider SDK
+    kwargs.setdefault("max_retries", 0)
+
+    def estimate_tokens():
+        return len(json.dumps(kwargs.get("messages", []), default=str)) // 4 + (kwargs.get("max_tokens") or 0)
+
+    def on_retry(attempt, delay, error):
+        stats = _job_stats.get()
+        if stats is not None:
+            stats["retries"] += 1
+            if retry.is_rate_limit(error):
+                stats["rate_limit_retries"] += 1
+        print(f"{type(error).__name__} from {provider}. Retrying in {delay:.2f} seconds... "
+              f"(Attempt {attempt}/{retry.policy.max_retries})")
+
+    # Refuses the call once the run's budget (if any) is spent
+    cost.check_budget()
+    litellm = prepare()
+    if "client" not in kwargs:
+        # Reuse the provider's pooled connections (see http_pool.py)
+        client = http_pool.litellm_client(provider, wire_format, kwargs)
+        if client is not None:
+            kwargs["client"] = client
+    started = time.perf_counter()
+    response = await retry.call_with_retries(provider, lambda: litellm.acompletion(**kwargs),
+                                             estimate_tokens, on_retry)
+    stats = _job_stats.get()
+    if stats is not None:
+        stats["requests"] += 1
+    if hasattr(response, "model_dump"):
+        _add_usage(model, getattr(response, "usage", None), started, stats)
+        return response
+    return _count_stream_usage(model, response, started, stats)
+
+
+def _add_usage(model, usage, started, stats):
+    """Add a call's tokens and cost to the run totals and the job's counters"""
+    if not usage:
+        return
+    call = cost.add_usage(model, usage, time.perf_counter() - started)
+    if stats is not None:
+        for field in USAGE_FIELDS:
+            stats[field] += call[field]
+        if call["cost"] is not None:
+            stats["cost"] = (stats["cost"] or 0.0) + call["cost"]
+
+
+async def _count_stream_usage(model, stream, started, stats):
+    """Pass a stream through, accounting for its usage chunk (if any)"""
+    try:
+        async for chunk in stream:
+            _add_usage(model, getattr(chunk, "usage", None), started, stats)
+            yield chunk
+    finally:
+        # Close the response as soon as the caller is done with the stream (or
+        # gives up on it), so its connection isn't held until garbage collection
+        if hasattr(stream, "aclose"):
+            await stream.aclose()
+
+
+# Function to load one of the test scripts as a module
+def load_script(test_name):
+    """Import the script behind test_name and return the module"""
+    if test_name not in _scripts:
+        filename, _ = TESTS[test_name]
+        path = os.path.join(SCRIPT_DIR, filename)
+        spec = importlib.util.spec_from_file_location(test_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _scripts[test_name] = module
+    return _scripts[test_name]
+
+
+# Function to look up the async test function for a test name
+def get_test(test_name):
+    module = load_script(test_name)
+    return getattr(module, TESTS[test_name][1])
+
+
+# Function to work out which provider serves a model
+def provider_of(model):
+    """Return the provider name used to group concurrency limits"""
+    if "/" in model:
+        return model.split("/", 1)[0]
+    # Common names are recognised without importing litellm
+    if model.startswith("claude"):
+        return "anthropic"
+    if model.startswith(("gpt", "o1", "o3", "o4")):
+        return "openai"
+    try:
+        return prepare().get_llm_provider(model)[1]
+    except Exception:
+        return "default"
+
+
+@contextlib.contextmanager
+def captured_output():
+    """Hold back print() output from jobs started with run_job() inside the block"""
+    stdout = sys.stdout
+    sys.stdout = _JobStdout(stdout)
+    try:
+        yield stdout
+    finally:
+        sys.stdout = stdout
+
+
+# Function to run one test against one model with its output captured
+async def run_job(test_name, model, semaphore=None, params=None):
+    """
+    Run a test and return its result dict with test, model, wall_time,
+    request and token counters and the captured output added. params are
+    passed to the test function as keyword arguments (request parameters
+    such as max_tokens). Call inside captured_output(), otherwise the
+    output is printed as usual and "output" is empty.
+
+    A record of the result is also appended to the metrics store (see
+    metrics.py).
+    """
+    buffer = io.StringIO()
+    _output.set(buffer)
+    stats = dict({"retries": 0, "rate_limit_retries": 0, "cache_hits": 0, "requests": 0, "cost": None},
+                 **dict.fromkeys(USAGE_FIELDS, 0))
+    _job_stats.set(stats)
+    if http_pool.enabled:
+        http_pool.track(stats)
+    prepare()
+    async with semaphore or contextlib.nullcontext():
+        start_time = time.perf_counter()
+        with profiler.job(test_name, model):
+            try:
+                result = await get_test(test_name)(model, **(params or {}))
+            except Exception as e:
+                print(f"Error testing {model}: {str(e)}")
+                result = {"ok": False, "error": str(e), "error_type": type(e).__name__}
+        end_time = time.perf_counter()
+
+    # The counters summed from each response's usage win over any field of the same name the test returns
+    result = dict(result or {}, **stats)
+    result.setdefault("ok", True)
+    result.update(test=test_name, model=model, provider=provider_of(model), wall_time=end_time - start_time)
+    if params:
+        result["params"] = params
+    metrics.record(result)
+    result["output"] = buffer.getvalue()
+    return result
+
+
+# Function to run every test against every model concurrently
+async def run_matrix(jobs, concurrency=DEFAULT_CONCURRENCY, provider_limits=None, echo=True):
+    """
+    Run (test_name, model) or (test_name, model, params) jobs concurrently
+    and return their results.
+
+    Each provider gets its own semaphore so that a slow or rate-limited
+    provider does not hold up the others. provider_limits overrides the
+    default concurrency for individual providers, e.g. {"anthropic": 1}.
+    Output printed by each job is held back and printed in one piece when
+    the job finishes so runs don't interleave.
+    """
+    provider_limits = provider_limits or {}
+    semaphores = {}
+    tasks = []
+    for test_name, model, *params in jobs:
+        provider = provider_of(model)
+        if provider not in semaphores:
+            semaphores[provider] = asyncio.Semaphore(provider_limits.get(provider, concurrency))
+        tasks.append(asyncio.create_task(run_job(test_name, model, semaphores[provider], *params)))
+
+    results = []
+    with captured_output() as stdout:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if echo:
+                stdout.write(result["output"])
+                stdout.flush()
+            results.append(result)
+    return results
+
+
+# Function to build the job list for the selected tests
+def build_jobs(test_names, models=None):
+    """Pair each test with the models from its script, or with models if given"""
+    jobs = []
+    for test_name in test_names:
+        test_models = models or load_script(test_name).models
+        for model in test_models:
+            jobs.append((test_name, model))
+    return jobs
+
+
+# Function to print a one-line-per-job summary
+def print_summary(results, total_time):
+    print(f"\n=== Summary ({len(results)} runs in {total_time:.2f} seconds) ===")
+    for result in sorted(results, key=lambda r: (r["test"], r["model"])):
+        status = "PASS" if result["ok"] else "FAIL"
+        print(f"{status}  {result['test']:<22} {result['model']:<40} {result['wall_time']:.2f}s")
+    failed = sum(1 for r in results if not r["ok"])
+    print(f"{len(results) - failed} passed, {failed} failed")
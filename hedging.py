@@ -0,0 +1,308 @@
+"""
+Hedged requests and latency-aware routing across the test models.
+
+The prompts of basic-completion.py and system-message-test.py are sent
+with three strategies, and their latency and cost are compared:
+
+    fixed    every request goes to one model (one run per model)
+    routed   each request goes to a model picked at random, weighted by the
+             inverse of its recent median time to first token
+    hedged   routed, and if no first token has arrived by the model's
+             --quantile deadline, the same request is also sent to the next
+             model; whichever streams a first token first is kept and the
+             other is cancelled
+
+Router keeps a moving window of the last --window first-token times per
+model. A request cancelled before its first token still adds the time it
+had waited, a lower bound, so a model that keeps losing hedges doesn't
+look faster than it is. Cancelled requests are charged for their prompt
+tokens, since providers bill for prompt processing that has started.
+
+    python hedging.py --requests 200 --quantile 90
+    python hedging.py --models mock/openai/tail "mock/anthropic/tail?seed=1" --requests 300
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import time
+
+import cost
+import harness
+import long_context
+import results
+from latency import percentile
+from stream_consumer import StreamConsumer
+
+# Models compared when none are given (same as system-message-test.py)
+DEFAULT_MODELS = [
+    "openai/gpt-4o",
+    "anthropic/claude-3-5-sonnet-latest"
+]
+
+# First-token samples needed before a model's window is trusted
+MIN_SAMPLES = 5
+
+# Hedge deadline (seconds) for models without enough samples
+DEFAULT_DEADLINE = 1.0
+
+
+# Function to collect the prompts of the basic completion and system message tests
+def load_prompts():
+    basic = harness.load_script("basic_completion")
+    system = harness.load_script("system_message")
+    return [
+        [{"role": "user", "content": basic.user_message}],
+        [{"role": "system", "content": system.system_message}, {"role": "user", "content": system.user_message}],
+    ]
+
+
+class Router:
+    """
+    Pick models by their recent time to first token and set hedge deadlines.
+
+    Each model has a window of its last `window` first-token times. Models
+    with fewer than MIN_SAMPLES are tried first; after that the primary
+    model is drawn with probability proportional to 1 / median.
+    """
+
+    def __init__(self, models, window=50, quantile=90, seed=0):
+        self.models = list(models)
+        self.quantile = quantile
+        self.windows = {model: collections.deque(maxlen=window) for model in self.models}
+        self._random = random.Random(seed)
+
+    def record(self, model, seconds):
+        self.windows[model].append(seconds)
+
+    def estimate(self, model):
+        """Median first-token time in the window, or None without enough samples"""
+        samples = self.windows[model]
+        return percentile(samples, 50) if len(samples) >= MIN_SAMPLES else None
+
+    def deadline(self, model):
+        """Seconds to wait for a first token before hedging: the window's quantile"""
+        samples = self.windows[model]
+        return percentile(samples, self.quantile) if len(samples) >= MIN_SAMPLES else DEFAULT_DEADLINE
+
+    def pick(self):
+        """Return the models in the order to try them: the primary, then backups"""
+        unknown = sorted((m for m in self.models if self.estimate(m) is None), key=lambda m: len(self.windows[m]))
+        if unknown:
+            primary = unknown[0]
+        else:
+            weights = [1 / max(self.estimate(m), 1e-6) for m in self.models]
+            primary = self._random.choices(self.models, weights)[0]
+        # Backups: another provider first (its outages are independent), then the fastest
+        provider = harness.provider_of(primary)
+        backups = sorted((m for m in self.models if m != primary),
+                         key=lambda m: (harness.provider_of(m) == provider, self.estimate(m) or 0))
+        return [primary] + backups
+
+
+async def _open(model, messages, max_tokens):
+    """Start a streamed request and wait for its first content chunk"""
+    started = time.perf_counter()
+    stream = await harness.acompletion(
+        model=model,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+        max_tokens=max_tokens
+    )
+    early = []
+    try:
+        async for chunk in stream:
+            early.append(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                return {"model": model, "stream": stream, "early": early, "ttft": time.perf_counter() - started}
+    except asyncio.CancelledError:
+        if hasattr(stream, "aclose"):
+            await stream.aclose()
+        raise
+    return {"model": model, "stream": None, "early": early, "ttft": time.perf_counter() - started}
+
+
+async def _rest(early, stream):
+    for chunk in early:
+        yield chunk
+    if stream is not None:
+        async for chunk in stream:
+            yield chunk
+
+
+# Function to price the prompt of a request that was cancelled
+def prompt_cost(model, messages):
+    import litellm
+    tokens = litellm.token_counter(model=long_context.tokenizer_model(model), messages=messages)
+    return cost.call_cost(model, litellm.Usage(prompt_tokens=tokens, completion_tokens=0, total_tokens=tokens))
+
+
+# Function to send one request, hedging it if it is slow to start
+async def send(router, messages, max_tokens, hedge):
+    """
+    Return the outcome of one request: ok, the model that answered, time to
+    first token and total latency (from the start, including any wait for
+    the hedge), how many requests were sent and what they cost.
+    """
+    order = router.pick()
+    started = time.perf_counter()
+    attempts = {asyncio.ensure_future(_open(order[0], messages, max_tokens)): (order[0], started)}
+    sent = 1
+    backups = order[1:] if hedge else []
+    timeout = router.deadline(order[0]) if backups else None
+    winner, error = None, None
+    extra_cost = 0.0
+
+    while attempts and winner is None:
+        done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            model, _ = attempts.pop(task)
+            if task.exception() is not None:
+                error = task.exception()
+            elif task.result()["stream"] is None:
+                error = ValueError(f"{model} returned no content")
+            elif winner is None:
+                winner = task.result()
+            else:
+                # Both started streaming at once: keep one, close the other
+                router.record(model, task.result()["ttft"])
+                await task.result()["stream"].aclose()
+                extra_cost += prompt_cost(model, messages) or 0.0
+        # Hedge when the deadline passes, or fail over as soon as a request fails
+        if winner is None and backups and (not done or not attempts):
+            model = backups.pop(0)
+            attempts[asyncio.ensure_future(_open(model, messages, max_tokens))] = (model, time.perf_counter())
+            sent += 1
+            timeout = None
+
+    # Cancel the losers; their wait so far is a lower bound on their first-token time
+    for task, (model, attempt_started) in attempts.items():
+        task.cancel()
+        router.record(model, time.perf_counter() - attempt_started)
+        extra_cost += prompt_cost(model, messages) or 0.0
+    if attempts:
+        await asyncio.gather(*attempts, return_exceptions=True)
+
+    if winner is None:
+        return {"ok": False, "error": str(error)[:300] if error else "no content", "sent": sent,
+                "cost": extra_cost, "latency": time.perf_counter() - started}
+    router.record(winner["model"], winner["ttft"])
+    ttft = time.perf_counter() - started
+    stream = await StreamConsumer(echo="off").consume(_rest(winner["early"], winner["stream"]))
+    latency = time.perf_counter() - started
+    call_cost = cost.call_cost(winner["model"], stream.usage) if stream.usage else None
+    return {"ok": True, "model": winner["model"], "hedged": sent > 1, "backup_won": winner["model"] != order[0],
+            "ttft": ttft, "latency": latency, "sent": sent, "cost": (call_cost or 0.0) + extra_cost}
+
+
+# Function to run a series of requests with one strategy
+async def run_strategy(router, prompts, requests, concurrency, max_tokens, hedge):
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        async with limit:
+            try:
+                return await send(router, prompts[index % len(prompts)], max_tokens, hedge)
+            except Exception as e:
+                return {"ok": False, "error": str(e)[:300], "sent": 1, "cost": 0.0}
+
+    return await asyncio.gather(*(one(index) for index in range(requests)))
+
+
+# Function to summarize one strategy's outcomes
+def summarize(outcomes):
+    ok = [o for o in outcomes if o["ok"]]
+    ttfts = [o["ttft"] for o in ok]
+    latencies = [o["latency"] for o in ok]
+    total_cost = sum(o["cost"] for o in outcomes)
+    return {
+        "requests": len(outcomes),
+        "errors": len(outcomes) - len(ok),
+        "sent": sum(o["sent"] for o in outcomes),
+        "hedged": sum(1 for o in ok if o.get("hedged")),
+        "backup_won": sum(1 for o in ok if o.get("backup_won")),
+        "models": dict(collections.Counter(o["model"] for o in ok)),
+        "ttft_p50": percentile(ttfts, 50), "ttft_p95": percentile(ttfts, 95), "ttft_p99": percentile(ttfts, 99),
+        "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+        "cost": total_cost,
+        "cost_per_1k": total_cost / len(outcomes) * 1000 if outcomes else 0.0,
+    }
+
+
+def _seconds(value):
+    return f"{value:.3f}" if value is not None else "-"
+
+
+def _change(new, old):
+    return f"{(new / old - 1) * 100:+.0f}%" if new is not None and old else "-"
+
+
+def print_report(report):
+    fixed = {name: s for name, s in report.items() if name.startswith("fixed") and s["p99"] is not None}
+    baseline_name = min(fixed, key=lambda name: fixed[name]["p99"]) if fixed else None
+    baseline = report.get(baseline_name)
+    print("\n=== Hedging and routing ===")
+    print(f"{'strategy':<48} {'n':>5} {'err':>4} {'sent':>5} {'hedged':>6} {'ttft p50':>8} {'ttft p99':>8} "
+          f"{'p50':>7} {'p95':>7} {'p99':>7} {'$/1k':>8} {'p99 chg':>7} {'$ chg':>6}")
+    for name, s in report.items():
+        p99_change = _change(s["p99"], baseline["p99"]) if baseline else "-"
+        cost_change = _change(s["cost_per_1k"], baseline["cost_per_1k"]) if baseline else "-"
+        print(f"{name:<48} {s['requests']:>5} {s['errors']:>4} {s['sent']:>5} {s['hedged']:>6} "
+              f"{_seconds(s['ttft_p50']):>8} {_seconds(s['ttft_p99']):>8} {_seconds(s['p50']):>7} "
+              f"{_seconds(s['p95']):>7} {_seconds(s['p99']):>7} {s['cost_per_1k']:>8.4f} {p99_change:>7} "
+              f"{cost_change:>6}")
+    if baseline_name:
+        print(f"Changes are against {baseline_name}, the fixed model with the lowest p99 latency")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed, latency-routed and hedged requests across models")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, help="Models to route between")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per strategy (default: 100)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once (default: 4)")
+    parser.add_argument("--quantile", type=float, default=90,
+                        help="Hedge once the first token is later than this percentile of the model's window")
+    parser.add_argument("--window", type=int, default=50, help="First-token samples kept per model (default: 50)")
+    parser.add_argument("--max-tokens", type=int, default=50, help="max_tokens for each response")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the routing choices")
+    parser.add_argument("--output", help="Output path (default: results/hedging-<run id>.json)")
+    parser.add_argument("--budget", type=float, metavar="USD",
+                        help="Stop sending requests once this much has been spent (priced by litellm)")
+    args = parser.parse_args()
+    if len(args.models) < 2:
+        parser.error("routing and hedging need at least two --models")
+    if not 0 < args.quantile < 100:
+        parser.error("--quantile must be between 0 and 100")
+    cost.set_budget(args.budget)
+
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
+    prompts = load_prompts()
+    strategies = [(f"fixed {model}", [model], False) for model in args.models]
+    strategies += [("routed", args.models, False), (f"hedged at p{args.quantile:g}", args.models, True)]
+
+    async def run_all():
+        report = {}
+        for name, models, hedge in strategies:
+            print(f"Running {name}...", flush=True)
+            router = Router(models, args.window, args.quantile, args.seed)
+            outcomes = await run_strategy(router, prompts, args.requests, args.concurrency, args.max_tokens, hedge)
+            report[name] = summarize(outcomes)
+        return report
+
+    report = asyncio.run(run_all())
+    print_report(report)
+
+    os.makedirs(results.RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(results.RESULTS_DIR, f"hedging-{results.RUN_ID}.json")
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump({"run_id": results.RUN_ID, "quantile": args.quantile, "strategies": report}, file, indent=2)
+    cost.print_summary()
+    print(f"\nReport written to {output}")
+
+
+if __name__ == "__main__":
+    main()
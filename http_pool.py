@@ -0,0 +1,296 @@
+"""
+Shared, long-lived HTTP clients for model calls, with per-phase timings.
+
+Each provider gets one httpx.AsyncClient per event loop with a keep-alive
+pool, so only the first calls to a provider pay for the DNS lookup, TCP
+connect and TLS handshake. The pool size can be set per provider, HTTP/2
+can be switched on (it needs the h2 package), and keep-alive can be
+switched off to measure what a fresh connection per call costs.
+
+Requests beyond the pool size wait for a connection (pool_wait below), so
+the entry points raise the default size to the number of requests they
+keep in flight (--concurrency, --workers, ...) and print the sizes used.
+httpcore checks every idle connection of a pool each time a request starts
+or finishes, so a large pool is split into clients of at most SHARD_SIZE
+connections that take requests in turn.
+
+harness.acompletion() hands the pooled client to litellm: OpenAI-format
+models get an AsyncOpenAI client built on it and Anthropic-format models an
+AsyncHTTPHandler (mock models included). Other providers keep litellm's own
+clients and aren't timed.
+
+httpcore reports each step of a request through its trace extension, which
+splits every request into phases:
+
+    pool_wait   waiting for a connection from the pool
+    connect     DNS lookup and TCP connect (new connections only)
+    tls         TLS handshake and HTTP/2 setup (new connections only)
+    request     sending the request headers and body
+    first_byte  waiting for the response headers
+    body        reading the response body (the whole stream, when streaming)
+
+The phases are added up per provider for print_summary(), and into the
+counters of the job that made the request (see track()).
+"""
+import asyncio
+import contextvars
+import functools
+import importlib.util
+import itertools
+import os
+import re
+import threading
+import time
+import weakref
+
+# Connections kept per provider unless configure() is given another size
+DEFAULT_POOL_SIZE = 10
+
+# Most connections in one httpx client; bigger pools are split across clients
+SHARD_SIZE = 10
+
+# Seconds an idle connection is kept open
+KEEPALIVE_EXPIRY = 60.0
+
+# Phases each request is split into, in order
+PHASES = ("pool_wait", "connect", "tls", "request", "first_byte", "body")
+
+# Phases spent on the transport rather than on the model
+TRANSPORT_PHASES = ("pool_wait", "connect", "tls", "request")
+
+# Counters added to the results of jobs that use the pool
+STAT_FIELDS = ("connections",) + tuple(f"{phase}_ms" for phase in PHASES)
+
+# httpcore trace step -> phase it is counted in
+STEP_PHASES = {
+    "connect_tcp": "connect",
+    "connect_unix_socket": "connect",
+    "start_tls": "tls",
+    "send_connection_init": "tls",
+    "send_request_headers": "request",
+    "send_request_body": "request",
+    "receive_response_headers": "first_byte",
+    "receive_response_body": "body",
+}
+
+# Events that end an OpenAI or Anthropic event stream (Anthropic sends one
+# message_delta, with the stop reason, just before message_stop)
+STREAM_END = re.compile(rb"(?:^|\n)(?:data: \[DONE\]|event: message_delta)")
+
+enabled = os.getenv("HTTP_POOL", "1") not in ("", "0")
+http2 = False
+keepalive = True
+default_pool_size = DEFAULT_POOL_SIZE
+pool_sizes = {}
+
+_lock = threading.Lock()
+totals = {}
+
+# Event loop -> {key: client}, since connections can't move between loops
+_clients = weakref.WeakKeyDictionary()
+
+# Provider -> counter that deals requests out to the provider's clients
+_turns = {}
+
+# Counters of the job the current request belongs to
+_job_stats = contextvars.ContextVar("http_pool_job_stats", default=None)
+
+
+# Function to change the pool settings (before the first call)
+def configure(enable=True, use_http2=None, keep_alive=None, sizes=None, in_flight=None):
+    """
+    sizes maps providers to their pool size. in_flight is how many requests
+    the caller keeps in flight per provider; it raises the default size so
+    they don't queue for connections.
+    """
+    global enabled, http2, keepalive, default_pool_size
+    enabled = enable
+    if in_flight:
+        default_pool_size = max(DEFAULT_POOL_SIZE, in_flight)
+    if use_http2 is not None:
+        http2 = use_http2
+    if keep_alive is not None:
+        keepalive = keep_alive
+    if sizes:
+        pool_sizes.update(sizes)
+
+
+def pool_size(provider):
+    return pool_sizes.get(provider, default_pool_size)
+
+
+def _shards(provider):
+    """Return how many clients the provider's pool is split into"""
+    return -(-pool_size(provider) // SHARD_SIZE)
+
+
+def _next_shard(provider):
+    with _lock:
+        turn = _turns.setdefault(provider, itertools.count())
+        return next(turn) % _shards(provider)
+
+
+def http2_available():
+    return importlib.util.find_spec("h2") is not None
+
+
+# Function to send the current job's phase times to its counters
+def track(stats):
+    """Add the phases of requests made from here on (in this context) to stats"""
+    for field in STAT_FIELDS:
+        stats.setdefault(field, 0)
+    _job_stats.set(stats)
+
+
+def _add(provider, stats, field, value):
+    with _lock:
+        entry = totals.setdefault(provider, dict.fromkeys(("requests",) + STAT_FIELDS, 0))
+        entry[field] += value
+    if stats is not None and field in stats:
+        stats[field] += value
+
+
+class _RequestTrace:
+    """httpcore trace callback that times the phases of one request"""
+
+    def __init__(self, provider, stats):
+        self.provider = provider
+        self.stats = stats
+        self.created = time.perf_counter()
+        self.started = {}
+        self.waited = False
+
+    async def __call__(self, event, info):
+        now = time.perf_counter()
+        step, _, state = event.rpartition(".")
+        step = step.partition(".")[2]
+        if not self.waited:
+            # Everything before the first step is time spent waiting for the pool
+            self.waited = True
+            _add(self.provider, self.stats, "pool_wait_ms", (now - self.created) * 1000)
+        if state == "started":
+            self.started[step] = now
+            if step == "connect_tcp":
+                _add(self.provider, self.stats, "connections", 1)
+            elif step == "send_request_headers":
+                _add(self.provider, None, "requests", 1)
+            return
+        phase = STEP_PHASES.get(step)
+        if phase and step in self.started:
+            _add(self.provider, self.stats, f"{phase}_ms", (now - self.started.pop(step)) * 1000)
+
+
+class _EventStream:
+    """
+    Response body of an event stream that is read to its end as soon as the
+    last event arrives.
+
+    The SDKs stop reading at the last event, before the end of the chunked
+    body, and then either close the response (OpenAI), which drops an HTTP/1.1
+    connection instead of reusing it, or leave it open (Anthropic), which
+    keeps the connection out of the pool until garbage collection.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._closed = False
+
+    async def __aiter__(self):
+        chunks = self._stream.__aiter__()
+        async for chunk in chunks:
+            if STREAM_END.search(chunk):
+                # Only the end of the body is left; read it now and hand the connection back
+                chunk += b"".join([rest async for rest in chunks])
+                await self.aclose()
+                yield chunk
+                return
+            yield chunk
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            await self._stream.aclose()
+
+
+@functools.cache
+def _event_stream_type():
+    """_EventStream as the httpx.AsyncByteStream httpx expects (httpx is slow to import, so not at startup)"""
+    import httpx
+    return type("EventStream", (_EventStream, httpx.AsyncByteStream), {})
+
+
+def _client(provider, shard=0):
+    """Return this event loop's pooled httpx client for provider (one of its shards)"""
+    import httpx
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    if (provider, shard) not in clients:
+        size = -(-pool_size(provider) // _shards(provider))
+        limits = httpx.Limits(max_connections=size, max_keepalive_connections=size if keepalive else 0,
+                              keepalive_expiry=KEEPALIVE_EXPIRY)
+
+        async def on_request(request):
+            request.extensions["trace"] = _RequestTrace(provider, _job_stats.get())
+
+        async def on_response(response):
+            if response.headers.get("content-type", "").startswith("text/event-stream"):
+                response.stream = _event_stream_type()(response.stream)
+
+        clients[provider, shard] = httpx.AsyncClient(
+            limits=limits, http2=http2, timeout=httpx.Timeout(600.0, connect=10.0), follow_redirects=True,
+            event_hooks={"request": [on_request], "response": [on_response]})
+    return clients[provider, shard]
+
+
+# Function to pick the client= argument litellm should use for a call
+def litellm_client(provider, wire_format, kwargs):
+    """
+    Return a client built on the provider's pool for a call speaking
+    wire_format ("openai" or "anthropic"), or None to leave the call to
+    litellm's own clients.
+    """
+    if not enabled:
+        return None
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    shard = _next_shard(provider)
+    if wire_format == "openai":
+        api_key = kwargs.get("api_key") or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            # Let litellm report the missing key
+            return None
+        key = ("openai", provider, kwargs.get("api_base"), api_key, shard)
+        if key not in clients:
+            from openai import AsyncOpenAI
+            clients[key] = AsyncOpenAI(api_key=api_key, base_url=kwargs.get("api_base") or os.getenv("OPENAI_BASE_URL"),
+                                       http_client=_client(provider, shard), max_retries=0)
+        return clients[key]
+    if wire_format == "anthropic":
+        key = ("anthropic", provider, shard)
+        if key not in clients:
+            from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+            handler = AsyncHTTPHandler()
+            handler.client = _client(provider, shard)
+            clients[key] = handler
+        return clients[key]
+    return None
+
+
+# Function to print connection reuse and the mean time per phase for each provider
+def print_summary():
+    if not totals:
+        return
+    print(f"\n=== HTTP phases (mean ms per request; keep-alive {'on' if keepalive else 'off'}, "
+          f"HTTP/{'2' if http2 else '1.1'}) ===")
+    print(f"{'provider':<12} {'pool':>5} {'requests':>8} {'conns':>6} {'reused':>7} "
+          + " ".join(f"{phase:>10}" for phase in PHASES) + f" {'transport':>9}")
+    for provider, t in sorted(totals.items()):
+        requests = t["requests"]
+        if not requests:
+            continue
+        reused = 1 - min(t["connections"], requests) / requests
+        means = [t[f"{phase}_ms"] / requests for phase in PHASES]
+        total = sum(means)
+        transport = sum(t[f"{phase}_ms"] for phase in TRANSPORT_PHASES) / requests
+        share = f"{transport / total * 100:.0f}%" if total else "-"
+        print(f"{provider:<12} {pool_size(provider):>5} {requests:>8} {t['connections']:>6} {reused * 100:>6.0f}% "
+              + " ".join(f"{mean:>10.1f}" for mean in means) + f" {share:>9}")
+    print("transport = pool wait, connect, TLS and sending the request, as a share of all phases")
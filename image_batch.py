@@ -0,0 +1,181 @@
+"""
+Batch image input benchmark: vision throughput over a directory of images.
+
+Every image under the directory is sent to each model with the prompt from
+image-input-test.py. Images are encoded in a process pool ahead of the
+network calls: a producer keeps up to --prefetch images queued, so encoding
+overlaps the requests already in flight, and --concurrency workers send
+them. Reports per-image latency, bytes sent and images/minute per model.
+
+    python image_batch.py path/to/images --concurrency 8
+    python image_batch.py docs --models mock/openai/fast mock/anthropic/fast
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import harness
+import image_pipeline
+import results
+from latency import percentile
+
+# File extensions treated as images
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+# Question asked about every image
+PROMPT = "What's in this image? Describe it in detail."
+
+
+# Function to list the images under a directory
+def find_images(directory, recursive=True):
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files)
+                     if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        if not recursive:
+            break
+    return paths
+
+
+def _encode(path, limits):
+    """Runs in a pool process: return the data URL and the time it took"""
+    start_time = time.perf_counter()
+    image_url = image_pipeline.encode_image_url(path, **limits)
+    return image_url, time.perf_counter() - start_time
+
+
+# Function to queue encodes ahead of the workers
+async def produce(queue, images, models, pool, workers):
+    """
+    Submit each image to the pool and queue one job per model. Models whose
+    providers share image limits share one encode. queue.put() blocks once
+    the queue is full, which bounds how far encoding runs ahead.
+    """
+    loop = asyncio.get_running_loop()
+    limits = {model: image_pipeline.limits_for(model) for model in models}
+    for path in images:
+        encodes = {}
+        for model in models:
+            key = tuple(sorted(limits[model].items()))
+            if key not in encodes:
+                encodes[key] = loop.run_in_executor(pool, functools.partial(_encode, path, limits[model]))
+            await queue.put((model, path, encodes[key]))
+    for _ in range(workers):
+        await queue.put(None)
+
+
+# Function to send one encoded image to a model
+async def send(model, path, encoding):
+    record = {"model": model, "image": path}
+    try:
+        image_url, encode_time = await encoding
+        record.update(bytes_sent=len(image_url), encode_time=encode_time)
+        messages = [{"role": "user", "content": [
+            {"type": "text", "text": PROMPT},
+            {"type": "image_url", "image_url": {"url": image_url}}
+        ]}]
+        start_time = time.perf_counter()
+        await harness.acompletion(model=model, messages=messages)
+        record.update(ok=True, latency=time.perf_counter() - start_time, finished=time.perf_counter())
+    except Exception as e:
+        record.update(ok=False, error=str(e)[:300], error_type=type(e).__name__)
+    return record
+
+
+async def worker(queue, records):
+    while True:
+        job = await queue.get()
+        if job is None:
+            return
+        record = await send(*job)
+        records.append(record)
+        status = f"{record['bytes_sent'] / 1024:>8.1f} KB  {record['latency']:.2f}s" if record["ok"] \
+            else f"failed: {record['error'][:60]}"
+        print(f"{record['model']:<40} {os.path.basename(record['image']):<30} {status}", flush=True)
+
+
+async def run_batch(images, models, concurrency, prefetch, processes):
+    records = []
+    queue = asyncio.Queue(maxsize=max(prefetch, 1) * len(models))
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(processes) as pool:
+        await asyncio.gather(
+            produce(queue, images, models, pool, concurrency),
+            *(worker(queue, records) for _ in range(concurrency))
+        )
+    for record in records:
+        if record["ok"]:
+            record["finished"] -= start_time
+    return records, time.perf_counter() - start_time
+
+
+# Function to summarize the records for each model
+def summarize(records, models):
+    summary = {}
+    for model in models:
+        model_records = [r for r in records if r["model"] == model]
+        ok = [r for r in model_records if r["ok"]]
+        latencies = [r["latency"] for r in ok]
+        # Throughput is measured up to the model's last completed image
+        elapsed = max((r["finished"] for r in ok), default=0)
+        summary[model] = {
+            "images": len(model_records),
+            "ok": len(ok),
+            "failed": len(model_records) - len(ok),
+            "bytes_sent": sum(r["bytes_sent"] for r in ok),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "images_per_minute": len(ok) / elapsed * 60 if elapsed else 0.0,
+        }
+    return summary
+
+
+def print_summary(summary, total_time):
+    print(f"\n=== Image batch ({total_time:.1f} seconds) ===")
+    print(f"{'model':<40} {'ok':>5} {'failed':>6} {'MB sent':>8} {'p50':>7} {'p95':>7} {'img/min':>8}")
+    for model, s in summary.items():
+        p50 = f"{s['p50']:.2f}s" if s["p50"] is not None else "-"
+        p95 = f"{s['p95']:.2f}s" if s["p95"] is not None else "-"
+        print(f"{model:<40} {s['ok']:>5} {s['failed']:>6} {s['bytes_sent'] / 1024 / 1024:>8.2f} "
+              f"{p50:>7} {p95:>7} {s['images_per_minute']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send every image in a directory to each model")
+    parser.add_argument("directory", help="Directory of images")
+    parser.add_argument("--models", nargs="+", help="Models to test (default: image-input-test.py's models)")
+    parser.add_argument("--concurrency", type=int, default=harness.DEFAULT_CONCURRENCY,
+                        help=f"Requests in flight at once (default: {harness.DEFAULT_CONCURRENCY})")
+    parser.add_argument("--prefetch", type=int, default=8, help="Images encoded ahead of the requests (default: 8)")
+    parser.add_argument("--processes", type=int, help="Encoding processes (default: one per CPU)")
+    parser.add_argument("--no-recursive", action="store_true", help="Don't look in subdirectories")
+    parser.add_argument("--limit", type=int, help="Only use the first N images")
+    parser.add_argument("--output", help="Output file (default: results/image-batch-<run id>.json)")
+    args = parser.parse_args()
+
+    images = find_images(args.directory, recursive=not args.no_recursive)[:args.limit]
+    if not images:
+        parser.error(f"No images found in {args.directory}")
+    models = args.models or harness.load_script("image_input").models
+    print(f"Sending {len(images)} images to {len(models)} models")
+    harness.prepare()
+
+    records, total_time = asyncio.run(run_batch(images, models, args.concurrency, args.prefetch, args.processes))
+    summary = summarize(records, models)
+    print_summary(summary, total_time)
+
+    os.makedirs(results.RESULTS_DIR, exist_ok=True)
+    path = args.output or os.path.join(results.RESULTS_DIR, f"image-batch-{results.RUN_ID}.json")
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"run_id": results.RUN_ID, "total_time": total_time, "summary": summary, "images": records},
+                  file, indent=2)
+    print(f"\nReport written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Image encoding for the image input tests.
+
+Images are encoded into data URLs once per file and the result is memoized
+by path, size and modification time, so every model and every retry reuses
+the same string. The file is memory-mapped and base64-encoded straight from
+the mapping without reading it into a bytes object first. The MIME type is
+detected from the file's magic bytes, and with Pillow installed, images can
+be downsized or recompressed to fit a provider's limits.
+"""
+import base64
+import functools
+import io
+import mimetypes
+import mmap
+import os
+
+# Per-provider image limits: raw bytes and longest side in pixels
+PROVIDER_LIMITS = {
+    "anthropic": {"max_bytes": 5 * 1024 * 1024, "max_dimension": 1568},
+    "openai": {"max_bytes": 20 * 1024 * 1024, "max_dimension": 2048},
+}
+
+# File signatures used to detect the MIME type
+SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+# Function to detect an image's MIME type from its first bytes
+def sniff_mime(header, path=""):
+    for signature, mime in SIGNATURES:
+        if header.startswith(signature):
+            return mime
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+# Function to look up the image limits for a model's provider
+def limits_for(model):
+    """Return max_bytes/max_dimension for model, or {} if its provider has none"""
+    import harness
+    provider = harness.provider_of(model)
+    if provider == "mock":
+        provider = model.split("/")[1]
+    return dict(PROVIDER_LIMITS.get(provider, {}))
+
+
+def _pillow():
+    """Return PIL.Image, imported on first use, or None if Pillow isn't installed"""
+    try:
+        from PIL import Image
+    except ImportError:  # Pillow is optional; without it images are sent as-is
+        return None
+    return Image
+
+
+def _shrink(pil, source, size, mime, max_bytes, max_dimension, quality):
+    """
+    Downsize and/or recompress an image with Pillow. Returns (bytes, mime),
+    or None if the image already fits. Pillow only reads the header to get
+    the dimensions, so images that fit are never decoded.
+    """
+    with pil.open(source) as image:
+        too_large = bool(max_dimension) and max(image.size) > max_dimension
+        too_heavy = bool(max_bytes) and size > max_bytes
+        if not too_large and not too_heavy:
+            return None
+        if too_large:
+            image.thumbnail((max_dimension, max_dimension))
+        # Photos shrink best as JPEG; keep PNG for images with transparency
+        keep_png = mime == "image/png" and image.mode in ("RGBA", "LA", "P")
+        out_format, out_mime = ("PNG", "image/png") if keep_png else ("JPEG", "image/jpeg")
+        if out_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        while True:
+            buffer = io.BytesIO()
+            image.save(buffer, out_format, quality=quality, optimize=True)
+            if not max_bytes or buffer.tell() <= max_bytes or out_format == "PNG" or quality <= 30:
+                return buffer.getvalue(), out_mime
+            quality -= 15
+
+
+@functools.lru_cache(maxsize=256)
+def _encode(path, mtime_ns, size, max_bytes, max_dimension, quality):
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        mime = sniff_mime(data[:16], path)
+        shrunk = None
+        pil = _pillow() if (max_bytes or max_dimension) and mime.startswith("image/") else None
+        if pil is not None:
+            shrunk = _shrink(pil, data, size, mime, max_bytes, max_dimension, quality)
+        if shrunk:
+            payload, mime = shrunk
+            encoded = base64.b64encode(payload)
+        else:
+            with memoryview(data) as view:
+                encoded = base64.b64encode(view)
+    return f"data:{mime};base64,{encoded.decode('ascii')}"
+
+
+# Function to turn an image file into a data URL
+def encode_image_url(path, max_bytes=None, max_dimension=None, quality=85):
+    """
+    Return a data URL for the image at path.
+
+    If max_dimension or max_bytes is given (and Pillow is installed) the
+    image is downsized so its longest side is at most max_dimension, and
+    recompressed at lower quality until it is under max_bytes. Results are
+    memoized until the file changes.
+    """
+    stat = os.stat(path)
+    return _encode(os.path.abspath(path), stat.st_mtime_ns, stat.st_size, max_bytes, max_dimension, quality)
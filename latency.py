@@ -0,0 +1,188 @@
+"""
+Latency measurement helpers shared by the tests and benchmarks.
+"""
+import math
+import statistics
+import time
+from array import array
+
+
+# Function to compute a percentile with linear interpolation
+def percentile(values, pct):
+    """Return the pct-th percentile (0-100) of values, or None if empty"""
+    if not values:
+        return None
+    return _percentile_sorted(sorted(values), pct)
+
+
+def _percentile_sorted(ordered, pct):
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class StreamTimer:
+    """
+    Record arrival times of streamed chunks.
+
+    The chunk loop should only call mark() (a bound list.append of a
+    perf_counter_ns() reading) so timing adds next to nothing per chunk;
+    all the statistics are worked out afterwards in summary().
+    """
+
+    def __init__(self):
+        self.start_ns = 0
+        self.end_ns = 0
+        self.chunk_ns = []
+        self._append = self.chunk_ns.append
+
+    def start(self):
+        self.start_ns = time.perf_counter_ns()
+
+    def mark(self):
+        self._append(time.perf_counter_ns())
+
+    def stop(self):
+        self.end_ns = time.perf_counter_ns()
+
+    def summary(self, output_tokens=None):
+        """
+        Return TTFT, inter-chunk percentiles and throughput in milliseconds.
+
+        output_tokens should come from the usage block when the provider
+        sends one; otherwise each content chunk is counted as one token.
+        """
+        chunks = self.chunk_ns
+        gaps = [(b - a) / 1e6 for a, b in zip(chunks, chunks[1:])]
+        tokens = output_tokens if output_tokens is not None else len(chunks)
+        generation_s = (chunks[-1] - chunks[0]) / 1e9 if len(chunks) > 1 else 0
+        return {
+            "ttft_ms": (chunks[0] - self.start_ns) / 1e6 if chunks else None,
+            "total_ms": (self.end_ns - self.start_ns) / 1e6,
+            "chunks": len(chunks),
+            "output_tokens": tokens,
+            "tokens_per_sec": tokens / generation_s if generation_s else None,
+            "inter_chunk_p50_ms": percentile(gaps, 50),
+            "inter_chunk_p95_ms": percentile(gaps, 95),
+            "inter_chunk_p99_ms": percentile(gaps, 99),
+        }
+
+
+class LatencyStore:
+    """
+    Latency samples in seconds, kept in a compact array of doubles.
+
+    Repeated benchmark runs can collect many thousands of samples per
+    model; an array('d') keeps them in 8 bytes each instead of one float
+    object per sample.
+    """
+
+    def __init__(self, samples=()):
+        self.samples = array("d", samples)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def stats(self):
+        """Return count, mean, stddev, min/max, p50/p90/p99 and sequential throughput"""
+        count = len(self.samples)
+        if not count:
+            return {"count": 0}
+        ordered = sorted(self.samples)
+        total = sum(ordered)
+        return {
+            "count": count,
+            "mean": total / count,
+            "stddev": statistics.stdev(ordered) if count > 1 else 0.0,
+            "min": ordered[0],
+            "max": ordered[-1],
+            "p50": _percentile_sorted(ordered, 50),
+            "p90": _percentile_sorted(ordered, 90),
+            "p99": _percentile_sorted(ordered, 99),
+            "throughput_rps": count / total if total else None,
+        }
+
+
+class Histogram:
+    """
+    Latency histogram with log-spaced buckets.
+
+    Each bucket is `growth` times wider than the previous one, so memory
+    stays small however many requests a load run makes, while percentiles
+    stay within one bucket width (10% by default) of the true value.
+    """
+
+    def __init__(self, growth=1.1, min_value=0.001):
+        self.growth = growth
+        self.min_value = min_value
+        self.counts = {}
+        self.count = 0
+
+    def _bucket(self, seconds):
+        if seconds <= self.min_value:
+            return 0
+        return int(math.log(seconds / self.min_value) / math.log(self.growth)) + 1
+
+    def upper_bound(self, bucket):
+        return self.min_value * self.growth ** bucket
+
+    def add(self, seconds):
+        bucket = self._bucket(seconds)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+
+    def percentile(self, pct):
+        """Return the upper bound of the bucket holding the pct-th percentile"""
+        if not self.count:
+            return None
+        target = self.count * pct / 100
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return self.upper_bound(bucket)
+        return self.upper_bound(max(self.counts))
+
+    def buckets(self):
+        """Return [upper bound in seconds, count] pairs in ascending order"""
+        return [[self.upper_bound(bucket), self.counts[bucket]] for bucket in sorted(self.counts)]
+
+
+# Function to test whether one set of latencies tends to be larger than another
+def mann_whitney_u(current, baseline):
+    """
+    One-sided Mann-Whitney U test that current samples tend to be larger
+    (slower) than baseline samples. Returns (U, p-value), using the normal
+    approximation with tie and continuity corrections, or (None, None) if
+    either side is empty.
+    """
+    n1, n2 = len(current), len(baseline)
+    if not n1 or not n2:
+        return None, None
+    combined = sorted([(value, 0) for value in current] + [(value, 1) for value in baseline])
+    n = n1 + n2
+
+    # Average ranks across ties and collect the tie correction
+    rank_sum = 0.0
+    tie_term = 0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        rank_sum += average_rank * sum(1 for k in range(i, j + 1) if combined[k][1] == 0)
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+
+    u = rank_sum - n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
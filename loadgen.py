@@ -0,0 +1,275 @@
+"""
+Load generation: sustained traffic against each model.
+
+Sends the requests from the basic completion and streaming tests (or any
+other test) over and over, either at a target request rate (open loop) or
+from a fixed number of workers that each wait for their last response
+(closed loop), and records latency histograms, error rates and rate-limit
+hits over time.
+
+    python loadgen.py --rps 5 --duration 60             # open loop
+    python loadgen.py --workers 8 --requests 500        # closed loop
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+import cost
+import harness
+import http_pool
+import metrics
+import profiler
+import results
+import stream_consumer
+from latency import Histogram
+
+# Tests used to generate load when none are given
+DEFAULT_TESTS = ["basic_completion", "streaming"]
+
+
+# Function to spot rate-limit errors in a test result
+def is_rate_limited(result):
+    if result.get("error_type") == "RateLimitError":
+        return True
+    error = (result.get("error") or "").lower()
+    return "rate limit" in error or "429" in error
+
+
+class LoadStats:
+    """Counters and latency histograms for one load run, overall and per time window"""
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self.start = time.perf_counter()
+        self.histogram = Histogram()
+        self.sent = 0
+        self.completed = 0
+        self.dropped = 0
+        self.rate_limited = 0
+        self.errors = {}
+        self.timeline = {}
+
+    def _window(self, started):
+        index = int((started - self.start) // self.window)
+        if index not in self.timeline:
+            self.timeline[index] = {"sent": 0, "ok": 0, "errors": 0, "rate_limited": 0, "histogram": Histogram()}
+        return self.timeline[index]
+
+    def record_sent(self, started):
+        self.sent += 1
+        self._window(started)["sent"] += 1
+
+    def record_result(self, result, started):
+        """Count the result; rate limits include 429s that harness.acompletion retried"""
+        self.completed += 1
+        window = self._window(started)
+        retried = result.get("rate_limit_retries") or 0
+        self.rate_limited += retried
+        window["rate_limited"] += retried
+        if result["ok"]:
+            latency = result.get("latency", result["wall_time"])
+            self.histogram.add(latency)
+            window["histogram"].add(latency)
+            window["ok"] += 1
+            return
+        error_type = result.get("error_type", "Error")
+        self.errors[error_type] = self.errors.get(error_type, 0) + 1
+        window["errors"] += 1
+        if is_rate_limited(result):
+            self.rate_limited += 1
+            window["rate_limited"] += 1
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        failed = sum(self.errors.values())
+        return {
+            "elapsed": elapsed,
+            "sent": self.sent,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "achieved_rps": self.completed / elapsed if elapsed else 0,
+            "error_rate": failed / self.completed if self.completed else 0,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "p50": self.histogram.percentile(50),
+            "p95": self.histogram.percentile(95),
+            "p99": self.histogram.percentile(99),
+            "histogram": self.histogram.buckets(),
+            "timeline": [
+                {"t": index * self.window, "sent": w["sent"], "ok": w["ok"], "errors": w["errors"],
+                 "rate_limited": w["rate_limited"], "p50": w["histogram"].percentile(50),
+                 "p95": w["histogram"].percentile(95)}
+                for index, w in sorted(self.timeline.items())
+            ],
+        }
+
+
+class StopCondition:
+    """Stop after a duration, a number of requests sent, or the budget, whichever comes first"""
+
+    def __init__(self, duration=None, requests=None):
+        self.deadline = time.perf_counter() + duration if duration else None
+        self.requests = requests
+
+    def reached(self, stats):
+        if cost.budget_exceeded():
+            return True
+        if self.requests is not None and stats.sent >= self.requests:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+
+def _send(test_name, model, stats):
+    """Count the request as sent straight away, so StopCondition sees it before the next one starts"""
+    started = time.perf_counter()
+    stats.record_sent(started)
+    return _request(test_name, model, stats, started)
+
+
+async def _request(test_name, model, stats, started):
+    result = await harness.run_job(test_name, model)
+    stats.record_result(result, started)
+
+
+# Function to send requests at a fixed rate regardless of response times
+async def open_loop(test_name, model, rps, stop, stats, max_in_flight=1000):
+    """
+    Start a request every 1/rps seconds. Requests that would push the
+    number in flight past max_in_flight are counted as dropped rather than
+    queued, so a slow provider can't make the client fall behind schedule.
+    """
+    interval = 1.0 / rps
+    in_flight = set()
+    next_send = time.perf_counter()
+    while not stop.reached(stats):
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            if stop.reached(stats):
+                break
+        next_send += interval
+        if len(in_flight) >= max_in_flight:
+            stats.dropped += 1
+            continue
+        task = asyncio.create_task(_send(test_name, model, stats))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+# Function to keep a fixed number of requests in flight
+async def closed_loop(test_name, model, workers, stop, stats):
+    async def worker():
+        while not stop.reached(stats):
+            await _send(test_name, model, stats)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+
+# Function to run the load profile against each test and model in turn
+async def run_load(jobs, rps=None, workers=None, duration=None, requests=None, window=5.0, max_in_flight=1000):
+    reports = []
+    with harness.captured_output():
+        for test_name, model in jobs:
+            print(f"\n=== Load test: {test_name} on {model} ===", flush=True)
+            stats = LoadStats(window)
+            stop = StopCondition(duration, requests)
+            if rps:
+                await open_loop(test_name, model, rps, stop, stats, max_in_flight)
+            else:
+                await closed_loop(test_name, model, workers, stop, stats)
+            report = stats.report()
+            report.update(test=test_name, model=model)
+            print_load_report(report)
+            reports.append(report)
+    return reports
+
+
+# Function to print the totals and the per-window timeline
+def print_load_report(report):
+    ms = lambda value: f"{value * 1000:.0f}" if value is not None else "-"
+    print(f"Sent {report['sent']}, completed {report['completed']}, dropped {report['dropped']} "
+          f"in {report['elapsed']:.1f}s ({report['achieved_rps']:.2f} req/s)")
+    print(f"Latency p50 {ms(report['p50'])} ms, p95 {ms(report['p95'])} ms, p99 {ms(report['p99'])} ms")
+    print(f"Error rate {report['error_rate'] * 100:.1f}%, rate-limited {report['rate_limited']}, "
+          f"errors {report['errors'] or '{}'}")
+    print(f"{'t(s)':>6} {'sent':>6} {'ok':>6} {'err':>5} {'429':>5} {'p50 ms':>8} {'p95 ms':>8}")
+    for w in report["timeline"]:
+        print(f"{w['t']:>6.0f} {w['sent']:>6} {w['ok']:>6} {w['errors']:>5} {w['rate_limited']:>5} "
+              f"{ms(w['p50']):>8} {ms(w['p95']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate sustained load against each model")
+    parser.add_argument("tests", nargs="*", help=f"Tests to send (default: {', '.join(DEFAULT_TESTS)})")
+    parser.add_argument("--models", nargs="+", help="Models to test instead of each script's models list")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--rps", type=float, help="Open loop: target requests per second")
+    mode.add_argument("--workers", type=int, help="Closed loop: number of concurrent workers")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--requests", type=int, help="Stop after sending this many requests")
+    parser.add_argument("--window", type=float, default=5.0, help="Timeline window in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=1000,
+                        help="Open loop: drop requests beyond this many in flight")
+    parser.add_argument("--output", help="Where to write the JSON report (default: results/load-<run id>.json)")
+    parser.add_argument("--budget", type=float, metavar="USD",
+                        help="Stop sending requests once this much has been spent (priced by litellm)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve live OpenMetrics counters and latency histograms on this port")
+    parser.add_argument("--pool-size", action="append", metavar="PROVIDER=N",
+                        help="Connections kept open for a provider (default: --workers or --max-in-flight)")
+    parser.add_argument("--no-pool", action="store_true",
+                        help="Let litellm create its own HTTP clients instead of the shared pool")
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample CPU and memory under load; writes results/profile-<run id>.*")
+    parser.add_argument("--profile-frames", type=int, default=profiler.DEFAULT_TRACE_FRAMES, metavar="N",
+                        help="Stack frames tracemalloc keeps per allocation; 0 samples only the CPU, "
+                             "which keeps the load close to an unprofiled run")
+    args = parser.parse_args()
+    for test_name in args.tests:
+        if test_name not in harness.TESTS:
+            parser.error(f"unknown test: {test_name}")
+    if not args.duration and not args.requests:
+        parser.error("give --duration and/or --requests")
+    if args.no_pool and args.pool_size:
+        parser.error("--pool-size configures the shared pool; drop --no-pool")
+    sizes = {}
+    for value in args.pool_size or []:
+        provider, _, size = value.partition("=")
+        sizes[provider] = int(size)
+    # Enough connections for every request in flight, so waiting for one doesn't count as latency
+    http_pool.configure(http_pool.enabled and not args.no_pool, sizes=sizes, in_flight=args.workers or args.max_in_flight)
+
+    jobs = harness.build_jobs(args.tests or DEFAULT_TESTS, args.models)
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    cost.set_budget(args.budget)
+    stream_consumer.set_echo("off")
+
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
+    with profiler.profile(trace_frames=args.profile_frames) if args.profile else contextlib.nullcontext() as profile:
+        reports = asyncio.run(run_load(jobs, args.rps, args.workers, args.duration, args.requests,
+                                       args.window, args.max_in_flight))
+
+    output = args.output or os.path.join(results.RESULTS_DIR, f"load-{results.RUN_ID}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        config = {"rps": args.rps, "workers": args.workers, "duration": args.duration, "requests": args.requests,
+                  "pool_size": http_pool.default_pool_size if http_pool.enabled else None, "pool_sizes": sizes}
+        json.dump({"run_id": results.RUN_ID, "config": config, "results": reports}, file, indent=2)
+    cost.print_summary()
+    http_pool.print_summary()
+    print(f"\nReport written to {output}")
+    if profile:
+        report, report_path, folded_path = profiler.save(profile, results.RESULTS_DIR, results.RUN_ID)
+        profiler.print_report(report)
+        print(f"\nProfile written to {report_path}, flame graph stacks to {folded_path}")
+
+
+if __name__ == "__main__":
+    main()
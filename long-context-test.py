@@ -1,14 +1,8 @@
-import os
 import time
-import litellm
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Set API keys
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-os.environ["ANTHROPIC_API_KEY"] = os.getenv("ANTHROPIC_API_KEY")
+import asyncio
+import argparse
+import harness
+import long_context
 
 # Define models to test (focused on long context models)
 models = [
@@ -28,36 +22,43 @@ def load_long_text(file_path):
     return text
 
 # Function to test long context
-def test_long_context(model):
-    """Test long context handling for a given model"""
+async def test_long_context(model, target_tokens=None, **params):
+    """Test long context handling for a given model, optionally at an exact prompt size"""
     print(f"\n=== Testing Long Context for {model} ===")
     
     # Path to your long text file
     long_text_path = "docs/llm.txt"  # Update this path to your file
     
     try:
-        # Load the long text
-        long_text = load_long_text(long_text_path)
-        text_length = len(long_text)
-        approx_tokens = len(long_text) // 4
-        
-        print(f"Loaded text with {text_length} characters (approximately {approx_tokens} tokens)")
-        
-        # User prompt with the long text
-        user_message = f"""
+        if target_tokens:
+            # Build a prompt of exactly target_tokens from the file (off the event loop)
+            user_message = await asyncio.to_thread(long_context.build_prompt, model, long_text_path, target_tokens)
+            prompt_tokens = target_tokens
+            print(f"Built prompt of {prompt_tokens} tokens from {long_text_path}")
+        else:
+            # Load the long text
+            long_text = load_long_text(long_text_path)
+            text_length = len(long_text)
+            
+            # User prompt with the long text
+            user_message = f"""
         Please provide a 3-bullet summary of the following text:
         
         {long_text}
         """
+            prompt_tokens = await asyncio.to_thread(long_context.count_tokens, model, user_message)
+            
+            print(f"Loaded text with {text_length} characters ({prompt_tokens} prompt tokens)")
         
         # Measure time manually
         start_time = time.time()
         
         try:
-            response = litellm.completion(
+            response = await harness.acompletion(
                 model=model,
                 messages=[{"role": "user", "content": user_message}],
-                max_tokens=500  # Limit response length
+                max_tokens=params.pop("max_tokens", 500),  # Limit response length
+                **params
             )
             
             end_time = time.time()
@@ -67,20 +68,34 @@ def test_long_context(model):
             print(f"Response:\n{response_message}")
             print(f"Time taken: {end_time - start_time:.2f} seconds")
             print("Test passed successfully!")
+            return {"ok": True, "latency": end_time - start_time, "built_prompt_tokens": prompt_tokens}
             
         except Exception as e:
             end_time = time.time()
             print(f"API Error: {str(e)}")
             print(f"Time taken before error: {end_time - start_time:.2f} seconds")
             print("This could indicate a context length error or other API limitation")
+            return {"ok": False, "error": str(e), "error_type": type(e).__name__, "latency": end_time - start_time}
             
     except FileNotFoundError:
         print(f"File not found: {long_text_path}")
         print("Please update the file path or create a sample long text file")
+        return {"ok": False, "error": f"File not found: {long_text_path}", "error_type": "FileNotFoundError"}
     except Exception as e:
         print(f"Error loading text: {str(e)}")
+        return {"ok": False, "error": str(e), "error_type": type(e).__name__}
 
-# Run test for each model
-if __name__ == "__main__":
+# Run test for each model (and each prompt size, if given)
+async def main(sizes):
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
     for model in models:
-        test_long_context(model)
\ No newline at end of file
+        for target_tokens in sizes or [None]:
+            await test_long_context(model, target_tokens)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test long context handling")
+    parser.add_argument("--tokens", nargs="+", type=long_context.parse_size,
+                        help="Prompt sizes to test, e.g. 8k 32k 128k 200k (default: the whole file)")
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens))
\ No newline at end of file
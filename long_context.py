@@ -0,0 +1,131 @@
+"""
+Token-budget-aware prompt building for the long context tests.
+
+The source file is memory-mapped and decoded a slice at a time, and only
+as much of it is tokenized as the target size needs. Files shorter than the
+target are read again from the start. Token counts come from litellm's
+tokenizer for each model rather than a characters/4 estimate.
+
+    prompt = build_prompt("openai/gpt-4o", "docs/llm.txt", 32_000)
+    document = build_document("openai/gpt-4o", "docs/llm.txt", 32_000)
+"""
+import codecs
+import mmap
+
+# Prompt wrapped around the long text
+PROMPT_TEMPLATE = """
+Please provide a 3-bullet summary of the following text:
+
+{text}
+"""
+
+# Padding that tokenizes as one token per repeat
+FILLER = " x"
+
+# Bytes decoded per slice of the memory-mapped file
+CHUNK_BYTES = 1 << 20
+
+
+# Function to parse sizes like "8k" or "128000"
+def parse_size(value):
+    value = value.strip().lower()
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1000)
+    return int(value)
+
+
+# Function to pick the tokenizer model for a test model
+def tokenizer_model(model):
+    """Mock models have no tokenizer of their own; count them like gpt-4o"""
+    return "gpt-4o" if model.startswith("mock/") else model
+
+
+# Function to stream the text of a file without reading it all at once
+def iter_text(path, chunk_bytes=CHUNK_BYTES):
+    """Yield decoded UTF-8 text from path in slices of about chunk_bytes"""
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        view = memoryview(data)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            for offset in range(0, len(view), chunk_bytes):
+                text = decoder.decode(view[offset:offset + chunk_bytes])
+                if text:
+                    yield text
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
+        finally:
+            view.release()
+
+
+def _encode(model, text):
+    import litellm
+    encoded = litellm.encode(model=model, text=text)
+    return list(getattr(encoded, "ids", encoded))
+
+
+# Function to count the tokens a prompt uses for a model
+def count_tokens(model, prompt):
+    """Count the tokens of prompt sent as a single user message"""
+    import litellm
+    return litellm.token_counter(model=tokenizer_model(model), messages=[{"role": "user", "content": prompt}])
+
+
+# Function to build a prompt of exactly target_tokens input tokens
+def build_prompt(model, path, target_tokens):
+    """
+    Return a prompt from PROMPT_TEMPLATE and the text in path that counts
+    as target_tokens input tokens for model (as a single user message).
+    Raises ValueError if the target is smaller than the template itself.
+    """
+    return _fill(model, path, target_tokens, PROMPT_TEMPLATE, lambda prompt: count_tokens(model, prompt))
+
+
+# Function to build text of exactly target_tokens tokens, without any instructions
+def build_document(model, path, target_tokens, template="{text}"):
+    """
+    Return template with its {text} filled from path so that the result is
+    target_tokens tokens long for model, counting the text alone rather than
+    a whole message. For prompts that put the text in a message of their own.
+    """
+    tokenizer = tokenizer_model(model)
+    return _fill(model, path, target_tokens, template, lambda text: len(_encode(tokenizer, text)))
+
+
+def _fill(model, path, target_tokens, template, count):
+    """Fill template's {text} from path until count() of the result is target_tokens"""
+    import litellm
+    tokenizer = tokenizer_model(model)
+    overhead = count(template.format(text=""))
+    budget = target_tokens - overhead
+    if budget <= 0:
+        raise ValueError(f"Target of {target_tokens} tokens is smaller than the prompt template ({overhead} tokens)")
+
+    # Tokenize slices of the file until there are enough tokens
+    tokens = []
+    while len(tokens) < budget:
+        read_any = False
+        for text in iter_text(path):
+            read_any = True
+            tokens.extend(_encode(tokenizer, text))
+            if len(tokens) >= budget:
+                break
+        if not read_any:
+            raise ValueError(f"{path} is empty")
+
+    # Re-tokenizing decoded text can merge or split tokens at slice and
+    # file boundaries, so count the real prompt, trim by any overshoot and
+    # fill the rest with single-token filler words
+    cut = budget
+    for _ in range(10):
+        # One filler word is always added so the body never merges with the template
+        body = litellm.decode(model=tokenizer, tokens=tokens[:max(cut, 0)]) + FILLER
+        missing = target_tokens - count(template.format(text=body))
+        if missing < 0:
+            cut += missing - 1
+            continue
+        prompt = template.format(text=body + FILLER * missing)
+        if count(prompt) == target_tokens:
+            return prompt
+        cut -= 1
+    raise ValueError(f"Could not build a prompt of exactly {target_tokens} tokens for {model}")
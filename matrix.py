@@ -0,0 +1,188 @@
+"""
+Declarative test matrix: which tests run against which models, with which
+request parameters and how many times, read from a TOML or YAML file.
+
+    # nightly.toml
+    iterations = 3
+    models = ["openai/gpt-4o-mini", "anthropic/claude-3-5-haiku-latest"]
+
+    [[matrix]]
+    tests = ["basic_completion", "system_message"]
+
+    [[matrix]]
+    tests = ["streaming"]
+    params = { max_tokens = [50, 500], temperature = 0 }
+
+Top-level tests, models, params and iterations are defaults for every
+[[matrix]] entry. Each list under params is a dimension of the matrix: the
+streaming entry above runs once per max_tokens value for each model (wrap a
+parameter that is itself a list in another list). Without models, an entry
+uses each script's models list.
+
+expand() turns the file into a numbered job list in schedule order, and
+shard() picks every n-th job so one file can be split across machines;
+run_jobs() can also spread a shard over several worker processes.
+"""
+import asyncio
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import harness
+from latency import percentile
+
+# Keys allowed in a [[matrix]] entry and as top-level defaults
+ENTRY_KEYS = {"tests", "models", "params", "iterations"}
+
+
+class MatrixError(ValueError):
+    """Raised for a matrix file that can't be loaded or expanded"""
+
+
+# Function to read a matrix file
+def load(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".toml":
+        try:
+            import tomllib
+        except ImportError:
+            # tomllib is only in the standard library from Python 3.11
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise MatrixError("TOML matrix files need Python 3.11 or tomli: pip install tomli") from None
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+    if extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise MatrixError("YAML matrix files need PyYAML: pip install pyyaml") from None
+        with open(path, encoding="utf-8") as file:
+            return yaml.safe_load(file) or {}
+    raise MatrixError(f"{path}: matrix files must be .toml, .yaml or .yml")
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+# Function to list every combination of the list-valued params
+def param_combinations(params):
+    keys = list(params)
+    for values in itertools.product(*(_as_list(params[key]) for key in keys)):
+        yield dict(zip(keys, values))
+
+
+# Function to expand a matrix config into its job list
+def expand(config):
+    """
+    Return the jobs as dicts with id, test, model, params and iteration.
+    Iterations are scheduled in rounds, so every combination runs once
+    before any of them runs a second time.
+    """
+    unknown = set(config) - ENTRY_KEYS - {"matrix"}
+    if unknown:
+        raise MatrixError(f"unknown top-level keys: {', '.join(sorted(unknown))}")
+
+    combinations = []
+    for number, entry in enumerate(config.get("matrix") or [{}], 1):
+        unknown = set(entry) - ENTRY_KEYS
+        if unknown:
+            raise MatrixError(f"matrix entry {number}: unknown keys: {', '.join(sorted(unknown))}")
+        params = dict(config.get("params") or {}, **(entry.get("params") or {}))
+        iterations = entry.get("iterations", config.get("iterations", 1))
+        for test_name in _as_list(entry.get("tests") or config.get("tests") or list(harness.TESTS)):
+            if test_name not in harness.TESTS:
+                raise MatrixError(f"matrix entry {number}: unknown test: {test_name}")
+            models = entry.get("models") or config.get("models") or harness.load_script(test_name).models
+            for model in _as_list(models):
+                for combination in param_combinations(params):
+                    combinations.append((test_name, model, combination, iterations))
+
+    jobs = []
+    for iteration in range(1, max((c[3] for c in combinations), default=0) + 1):
+        for test_name, model, params, iterations in combinations:
+            if iteration <= iterations:
+                jobs.append({"id": len(jobs), "test": test_name, "model": model,
+                             "params": params, "iteration": iteration})
+    return jobs
+
+
+# Function to parse "--shard 2/4" (1-based) into (index, count)
+def parse_shard(value):
+    index, _, count = value.partition("/")
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError(f"shard must look like 2/4 with 1 <= index <= count, not {value}")
+    return index - 1, count
+
+
+# Function to pick one shard of the job list
+def shard(jobs, index, count):
+    """Keep every count-th job starting at index (0-based), so shards get a similar mix"""
+    return [job for job in jobs if job["id"] % count == index]
+
+
+async def _run(jobs, concurrency, provider_limits, echo):
+    results = await harness.run_matrix([(job["test"], job["model"], job["params"]) for job in jobs],
+                                       concurrency, provider_limits, echo=echo)
+    # Results arrive in completion order; give each one the id of a matching job
+    pending = {}
+    for job in jobs:
+        pending.setdefault((job["test"], job["model"], repr(job["params"])), []).append(job)
+    for result in results:
+        job = pending[(result["test"], result["model"], repr(result.get("params") or {}))].pop(0)
+        result.update(job=job["id"], iteration=job["iteration"])
+        del result["output"]
+    return results
+
+
+def _run_worker(jobs, concurrency, provider_limits, setup):
+    """Runs in a worker process: apply the runner's settings and run jobs"""
+    if setup is not None:
+        setup()
+    harness.prepare()
+    start_time = time.perf_counter()
+    results = asyncio.run(_run(jobs, concurrency, provider_limits, echo=False))
+    print(f"Worker {os.getpid()} finished {len(jobs)} jobs in {time.perf_counter() - start_time:.1f} seconds",
+          flush=True)
+    return results
+
+
+# Function to run jobs in this process or across worker processes
+def run_jobs(jobs, workers=1, concurrency=harness.DEFAULT_CONCURRENCY, provider_limits=None, setup=None):
+    """
+    Run the jobs and return their results (without the captured output).
+
+    With workers > 1 the jobs are dealt out round-robin to that many
+    processes, each with its own event loop, concurrency limits and rate
+    limits. setup is called in each worker first and must be picklable,
+    e.g. a functools.partial of a module-level function.
+    """
+    if workers <= 1:
+        return asyncio.run(_run(jobs, concurrency, provider_limits, echo=True))
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_run_worker, jobs[index::workers], concurrency, provider_limits, setup)
+                   for index in range(workers) if jobs[index::workers]]
+        return [result for future in futures for result in future.result()]
+
+
+# Function to print pass counts and median latency per test, model and params
+def print_summary(results, total_time):
+    groups = {}
+    for result in results:
+        key = (result["test"], result["model"], json.dumps(result.get("params") or {}, sort_keys=True))
+        groups.setdefault(key, []).append(result)
+
+    print(f"\n=== Matrix summary ({len(results)} runs in {total_time:.2f} seconds) ===")
+    for (test_name, model, params), group in sorted(groups.items()):
+        latencies = [r.get("latency", r["wall_time"]) for r in group if r["ok"]]
+        median = f"p50 {percentile(latencies, 50):.2f}s" if latencies else ""
+        params = "" if params == "{}" else params
+        print(f"{test_name:<22} {model:<40} {params:<32} {len(latencies):>3}/{len(group):<3} passed  {median}")
+    failed = sum(1 for r in results if not r["ok"])
+    spent = sum(r.get("cost") or 0.0 for r in results)
+    print(f"{len(results) - failed} passed, {failed} failed, ${spent:.4f} spent")
@@ -0,0 +1,226 @@
+"""
+Structured metrics for every test run.
+
+harness.run_job() passes each result to record(), which appends one flat
+record to results/metrics.jsonl: test, model, provider, outcome and error
+class, the latency breakdown the test reported, token usage summed from
+response.usage, retry/cache counters, and the git revision and litellm
+version they ran with. The file is only ever appended
+to, and every record carries the run_id of the process that wrote it.
+
+The same records update in-process counters and latency histograms, which
+serve() exposes in the OpenMetrics text format for Prometheus to scrape
+during long runs (run-tests.py and loadgen.py take --metrics-port).
+
+    python metrics.py export                               # columnar .json.gz
+    python metrics.py export --output results/metrics.parquet   # needs pyarrow
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import results
+
+# JSONL file every record is appended to (under results/)
+METRICS_FILE = "metrics.jsonl"
+
+# Result fields copied into each record when the test reports them
+RECORD_FIELDS = [
+    "test", "model", "provider", "ok", "error_type", "error", "retries", "rate_limit_retries", "cache_hits",
+    "requests", "prompt_tokens", "completion_tokens", "cached_tokens", "cache_creation_tokens", "cost",
+    "latency", "wall_time", "ttft_ms", "total_ms", "inter_chunk_p50_ms", "inter_chunk_p95_ms",
+    "inter_chunk_p99_ms", "tokens_per_sec", "chunks", "model_time", "tool_time", "tool_dispatch_ms",
+    "stream_end_ms", "tools_done_ms", "payload_bytes", "built_prompt_tokens", "connections", "pool_wait_ms",
+    "connect_ms", "tls_ms", "request_ms", "first_byte_ms", "body_ms",
+]
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf")]
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "litellm_tests"
+
+
+# Function to flatten a test result into a metrics record
+def make_record(result):
+    record = {field: result[field] for field in RECORD_FIELDS if result.get(field) is not None}
+    if result.get("error"):
+        record["error"] = str(result["error"])[:300]
+    if result.get("params"):
+        record["params"] = json.dumps(result["params"], sort_keys=True)
+    record.update(git_rev=results.git_revision(), litellm_version=results.package_version("litellm"))
+    return record
+
+
+class LiveMetrics:
+    """Counters and latency histograms for the OpenMetrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.jobs = {}
+        self.retries = {}
+        self.tokens = {}
+        self.cost = {}
+        self.latency = {}
+
+    def add(self, record):
+        labels = (record["test"], record["model"])
+        outcome = "ok" if record["ok"] else record.get("error_type", "error")
+        with self._lock:
+            self.jobs[labels + (outcome,)] = self.jobs.get(labels + (outcome,), 0) + 1
+            self.retries[labels] = self.retries.get(labels, 0) + record.get("retries", 0)
+            for kind in ("prompt", "completion", "cached"):
+                key = (record["model"], kind)
+                self.tokens[key] = self.tokens.get(key, 0) + record.get(f"{kind}_tokens", 0)
+            self.cost[record["model"]] = self.cost.get(record["model"], 0.0) + record.get("cost", 0.0)
+            seconds = record.get("latency", record.get("wall_time"))
+            if record["ok"] and seconds is not None:
+                histogram = self.latency.setdefault(labels, {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0})
+                for index, bound in enumerate(LATENCY_BUCKETS):
+                    if seconds <= bound:
+                        histogram["buckets"][index] += 1
+                histogram["sum"] += seconds
+
+    def exposition(self):
+        """Return the metrics in the OpenMetrics text format"""
+        lines = []
+        with self._lock:
+            name = f"{METRIC_PREFIX}_jobs"
+            lines += [f"# TYPE {name} counter", f"# HELP {name} Test runs by outcome (ok or error class)"]
+            for (test, model, outcome), count in sorted(self.jobs.items()):
+                lines.append(f"{name}_total{_labels(test=test, model=model, outcome=outcome)} {count}")
+            name = f"{METRIC_PREFIX}_retries"
+            lines += [f"# TYPE {name} counter", f"# HELP {name} Retried model calls"]
+            for (test, model), count in sorted(self.retries.items()):
+                lines.append(f"{name}_total{_labels(test=test, model=model)} {count}")
+            name = f"{METRIC_PREFIX}_tokens"
+            lines += [f"# TYPE {name} counter", f"# HELP {name} Tokens reported in response usage"]
+            for (model, kind), count in sorted(self.tokens.items()):
+                lines.append(f"{name}_total{_labels(model=model, type=kind)} {count}")
+            name = f"{METRIC_PREFIX}_cost_usd"
+            lines += [f"# TYPE {name} counter", f"# HELP {name} Cost of the model calls from litellm's pricing"]
+            for model, total in sorted(self.cost.items()):
+                lines.append(f"{name}_total{_labels(model=model)} {total}")
+            name = f"{METRIC_PREFIX}_latency_seconds"
+            lines += [f"# TYPE {name} histogram", f"# UNIT {name} seconds",
+                      f"# HELP {name} Latency of successful test runs"]
+            for (test, model), histogram in sorted(self.latency.items()):
+                for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{name}_bucket{_labels(test=test, model=model, le=le)} {count}")
+                lines.append(f"{name}_count{_labels(test=test, model=model)} {histogram['buckets'][-1]}")
+                lines.append(f"{name}_sum{_labels(test=test, model=model)} {histogram['sum']}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+live = LiveMetrics()
+
+
+# Function every finished job's result is passed to
+def record(result):
+    """Append the result's record to results/metrics.jsonl and update the live metrics"""
+    entry = make_record(result)
+    results.append_jsonl(METRICS_FILE, entry)
+    live.add(entry)
+    return entry
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = live.exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to serve the live metrics over HTTP in a background thread
+def serve(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    print(f"Serving OpenMetrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+# Function to read the records back, optionally for one run
+def read_records(path, run_id=None):
+    with open(path, encoding="utf-8") as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    return [r for r in records if run_id is None or r.get("run_id") == run_id]
+
+
+# Function to turn records into columns
+def to_columns(records):
+    """
+    Return {column: values} for every field, with None where a record lacks
+    it. String columns with many repeats (model, test, error_type, ...) are
+    dictionary-encoded as {"dictionary": [...], "codes": [...]}.
+    """
+    names = []
+    for record in records:
+        names.extend(name for name in record if name not in names)
+    columns = {}
+    for name in names:
+        values = [record.get(name) for record in records]
+        strings = [value for value in values if value is not None]
+        if strings and all(isinstance(value, str) for value in strings) and len(set(strings)) * 2 <= len(values):
+            dictionary = sorted(set(strings))
+            index = {value: code for code, value in enumerate(dictionary)}
+            values = {"dictionary": dictionary, "codes": [index.get(value) for value in values]}
+        columns[name] = values
+    return columns
+
+
+# Function to write the records in a compact columnar form
+def export(records, output):
+    """Write Parquet if output ends in .parquet (needs pyarrow), otherwise gzipped columnar JSON"""
+    if output.endswith(".parquet"):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet export needs pyarrow: pip install pyarrow") from None
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(records), output, compression="zstd")
+        return
+    with gzip.open(output, "wt", encoding="utf-8") as file:
+        json.dump({"rows": len(records), "columns": to_columns(records)}, file, separators=(",", ":"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the metrics records")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export_parser = subcommands.add_parser("export", help="Write the JSONL records in columnar form")
+    export_parser.add_argument("--input", default=os.path.join(results.RESULTS_DIR, METRICS_FILE),
+                               help="JSONL records (default: results/metrics.jsonl)")
+    export_parser.add_argument("--output", default=os.path.join(results.RESULTS_DIR, "metrics.columns.json.gz"),
+                               help="Output file: .parquet, or gzipped columnar JSON (default)")
+    export_parser.add_argument("--run", help="Only export records from this run id")
+    args = parser.parse_args()
+
+    records = read_records(args.input, args.run)
+    export(records, args.output)
+    print(f"Exported {len(records)} records to {args.output} "
+          f"({os.path.getsize(args.input)} -> {os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
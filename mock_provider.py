@@ -0,0 +1,446 @@
+"""
+Local stand-in for the OpenAI and Anthropic chat APIs.
+
+Runs a small HTTP server that speaks both wire formats (plain, streamed and
+tool-call responses) so the suite can be benchmarked and run in CI without
+network access or API keys. Models are picked per entry in a script's
+models list:
+
+    "mock/openai/fast"                 OpenAI wire format, "fast" profile
+    "mock/anthropic/overloaded"        Anthropic wire format, "overloaded" profile
+    "mock/openai/slow?tokens=400"      profile settings can be overridden inline
+
+harness.acompletion() starts the server on first use. It can also be run on
+its own with `python mock_provider.py --port 8765`.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+# Settings every profile starts from
+DEFAULT_PROFILE = {
+    "ttft": 0.05,               # seconds before the first token
+    "inter_token_delay": 0.01,  # seconds between streamed tokens
+    "tokens": 20,               # completion tokens per response
+    "token_chars": 4,           # characters per generated token
+    "tool_calls": 1,            # tool calls returned when tools are offered
+    "error_rate": 0.0,          # fraction of requests that fail
+    "fail_first": 0,            # fail this many requests per model before succeeding
+    "error_status": 0,          # 0 picks 529 (Anthropic) or 429 (OpenAI)
+    "retry_after": 0,           # Retry-After header on errors, in seconds
+    "context_limit": 0,         # reject prompts over this many tokens (4 chars each); 0 = no limit
+    "prefill_per_1k": 0.0,      # extra seconds before the first token per 1k uncached prompt tokens
+    "slow_rate": 0.0,           # fraction of requests whose first token takes slow_ttft instead of ttft
+    "slow_ttft": 0.0,           # seconds before the first token on those requests
+    "seed": 0,                  # seed for error injection
+}
+
+# Named latency/failure profiles
+PROFILES = {
+    "fast": {"ttft": 0.0, "inter_token_delay": 0.0},
+    "default": {},
+    "slow": {"ttft": 1.0, "inter_token_delay": 0.05, "tokens": 100},
+    "long": {"tokens": 1000, "inter_token_delay": 0.002},
+    "flaky": {"error_rate": 0.3},
+    "overloaded": {"fail_first": 2, "retry_after": 1},
+    "parallel-tools": {"tool_calls": 3},
+    "small-context": {"context_limit": 16000},
+    "prefill": {"prefill_per_1k": 0.02},
+    "tail": {"ttft": 0.2, "slow_rate": 0.05, "slow_ttft": 3.0},
+}
+
+# Prompt caching: shortest cacheable prefix (in tokens) and how long a prefix stays cached
+CACHE_MIN_TOKENS = 1024
+CACHE_TTL = 300
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+
+_server = None
+_lock = threading.Lock()
+_request_counts = {}
+_rngs = {}
+_prompt_cache = {}
+
+
+# Function to turn a "name?key=value" model spec into profile settings
+def parse_profile(spec):
+    name, _, query = spec.partition("?")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown mock profile: {name} (choose from {', '.join(PROFILES)})")
+    profile = dict(DEFAULT_PROFILE, **PROFILES[name])
+    for key, value in parse_qsl(query):
+        if key not in DEFAULT_PROFILE:
+            raise ValueError(f"Unknown mock profile setting: {key}")
+        profile[key] = type(DEFAULT_PROFILE[key])(float(value))
+    return profile
+
+
+# Function to generate the completion text as a list of tokens
+def make_tokens(profile):
+    words = itertools.cycle(WORDS)
+    width = profile["token_chars"]
+    return [(" " + next(words))[:width].ljust(width) for _ in range(profile["tokens"])]
+
+
+# Function to build arguments for a tool from its JSON schema
+def make_tool_arguments(tool):
+    properties = tool.get("function", tool).get("parameters", tool.get("input_schema", {})).get("properties", {})
+    arguments = {}
+    for name, schema in properties.items():
+        if "enum" in schema:
+            arguments[name] = schema["enum"][0]
+        elif schema.get("type") in ("number", "integer"):
+            arguments[name] = 1
+        elif schema.get("type") == "boolean":
+            arguments[name] = True
+        else:
+            arguments[name] = "San Francisco, CA" if name == "location" else "mock"
+    return arguments
+
+
+def _should_fail(key, profile):
+    """Decide deterministically whether this request gets an injected error (counted per key)"""
+    with _lock:
+        count = _request_counts.get(key, 0)
+        _request_counts[key] = count + 1
+        rng = _rngs.setdefault(key, random.Random(profile["seed"]))
+        roll = rng.random()
+    return count < profile["fail_first"] or roll < profile["error_rate"]
+
+
+def _cache_prefix(body, anthropic):
+    """
+    Return the cacheable prefix of a request as JSON, or None. Anthropic
+    caches up to the last block marked with cache_control; OpenAI caches
+    automatically, here approximated as everything before the last message.
+    """
+    if not anthropic:
+        return json.dumps(body.get("messages", [])[:-1]) if len(body.get("messages", [])) > 1 else None
+    system = body.get("system") or []
+    blocks = [("system", block) for block in system] if isinstance(system, list) else []
+    for message in body.get("messages", []):
+        if isinstance(message.get("content"), list):
+            blocks += [(message["role"], block) for block in message["content"]]
+    marked = [index for index, (_, block) in enumerate(blocks) if "cache_control" in block]
+    return json.dumps(blocks[:marked[-1] + 1]) if marked else None
+
+
+# Function to look up (and store) a request's prefix in the prompt cache
+def _prompt_cache_usage(key, body, anthropic):
+    """Return (cached tokens read, tokens written to the cache) for this request"""
+    prefix = _cache_prefix(body, anthropic)
+    tokens = len(prefix) // 4 if prefix else 0
+    if tokens < CACHE_MIN_TOKENS:
+        return 0, 0
+    entry = (key, hashlib.sha256(prefix.encode()).hexdigest())
+    now = time.monotonic()
+    with _lock:
+        hit = now - _prompt_cache.get(entry, -CACHE_TTL) < CACHE_TTL
+        _prompt_cache[entry] = now
+    # OpenAI reports cached reads but not writes
+    return (tokens, 0) if hit else (0, tokens if anthropic else 0)
+
+
+def _first_token_delay(key, profile):
+    """Pick this request's time to first token: usually ttft, sometimes slow_ttft (seeded per key)"""
+    if not profile["slow_rate"]:
+        return profile["ttft"]
+    with _lock:
+        rng = _rngs.setdefault((key, "ttft"), random.Random(profile["seed"]))
+        roll = rng.random()
+    return profile["slow_ttft"] if roll < profile["slow_rate"] else profile["ttft"]
+
+
+def _tools_requested(body):
+    """Only answer with tool calls on the first turn, not after a tool result"""
+    if not body.get("tools") or not body.get("messages"):
+        return False
+    last = body["messages"][-1]
+    if last.get("role") == "tool":
+        return False
+    content = last.get("content")
+    if isinstance(content, list) and any(block.get("type") == "tool_result" for block in content):
+        return False
+    return True
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without TCP_NODELAY a kept-alive
+    # connection waits for the client's delayed ACK in between
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        # Clients may drop a kept-alive connection, or cancel a stream, at any time
+        try:
+            super().handle()
+        except ConnectionError:
+            pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        anthropic = self.path.rstrip("/").endswith("/messages")
+        model = body.get("model", "default")
+        # Injected errors, seeds and the prompt cache are kept per endpoint, so
+        # mock/openai/x and mock/anthropic/x don't share them
+        key = (self.path, model)
+
+        try:
+            profile = parse_profile(model)
+        except ValueError as e:
+            return self._send_error(400, anthropic, "invalid_request_error", str(e), 0)
+
+        prompt_tokens = (len(json.dumps(body.get("messages", []))) + len(json.dumps(body.get("system", "")))) // 4
+        if profile["context_limit"] and prompt_tokens > profile["context_limit"]:
+            if anthropic:
+                message = f"prompt is too long: {prompt_tokens} tokens > {profile['context_limit']} maximum"
+            else:
+                message = (f"This model's maximum context length is {profile['context_limit']} tokens. "
+                           f"However, your messages resulted in {prompt_tokens} tokens.")
+            return self._send_error(400, anthropic, "invalid_request_error", message, 0)
+
+        if _should_fail(key, profile):
+            status = profile["error_status"] or (529 if anthropic else 429)
+            kind = "overloaded_error" if status == 529 else "rate_limit_error"
+            return self._send_error(status, anthropic, kind, "Overloaded" if status == 529 else "Rate limit reached", profile["retry_after"])
+
+        tokens = make_tokens(profile)
+        tools = body.get("tools") if _tools_requested(body) else None
+        tool_calls = []
+        for tool in (tools or [])[:1] * profile["tool_calls"]:
+            name = tool.get("function", tool)["name"]
+            tool_calls.append((f"call_{uuid.uuid4().hex[:12]}", name, json.dumps(make_tool_arguments(tool))))
+        cache_read, cache_write = (min(count, prompt_tokens) for count in _prompt_cache_usage(key, body, anthropic))
+        usage = (prompt_tokens, len(tokens), cache_read, cache_write)
+
+        time.sleep(_first_token_delay(key, profile) + profile["prefill_per_1k"] * (prompt_tokens - cache_read) / 1000)
+        if body.get("stream"):
+            self._start_stream()
+            if anthropic:
+                self._stream_anthropic(model, tokens, tool_calls, usage, profile)
+            else:
+                self._stream_openai(model, tokens, tool_calls, usage, profile, body)
+            self._write_chunk(b"")
+        else:
+            time.sleep(profile["inter_token_delay"] * max(len(tokens) - 1, 0))
+            if anthropic:
+                payload = self._anthropic_message(model, tokens, tool_calls, usage)
+            else:
+                payload = self._openai_completion(model, tokens, tool_calls, usage)
+            self._send_json(200, payload)
+
+    # --- usage blocks ---
+
+    @staticmethod
+    def _openai_usage(usage):
+        block = {"prompt_tokens": usage[0], "completion_tokens": usage[1], "total_tokens": usage[0] + usage[1]}
+        if usage[2]:
+            block["prompt_tokens_details"] = {"cached_tokens": usage[2]}
+        return block
+
+    @staticmethod
+    def _anthropic_usage(usage, output_tokens):
+        """Anthropic's input_tokens leave out the tokens read from or written to the cache"""
+        block = {"input_tokens": usage[0] - usage[2] - usage[3], "output_tokens": output_tokens}
+        if usage[2] or usage[3]:
+            block.update(cache_read_input_tokens=usage[2], cache_creation_input_tokens=usage[3])
+        return block
+
+    # --- plain responses ---
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, anthropic, kind, message, retry_after):
+        if anthropic:
+            payload = {"type": "error", "error": {"type": kind, "message": message}}
+        else:
+            payload = {"error": {"message": message, "type": kind, "code": kind}}
+        headers = {"Retry-After": str(retry_after)} if retry_after else None
+        self._send_json(status, payload, headers)
+
+    def _openai_completion(self, model, tokens, tool_calls, usage):
+        message = {"role": "assistant", "content": None if tool_calls else "".join(tokens)}
+        if tool_calls:
+            message["tool_calls"] = [
+                {"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}
+                for call_id, name, arguments in tool_calls
+            ]
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+            "usage": self._openai_usage(usage),
+        }
+
+    def _anthropic_message(self, model, tokens, tool_calls, usage):
+        content = [{"type": "text", "text": "".join(tokens)}]
+        if tool_calls:
+            content = [
+                {"type": "tool_use", "id": call_id, "name": name, "input": json.loads(arguments)}
+                for call_id, name, arguments in tool_calls
+            ]
+        return {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": content,
+            "stop_reason": "tool_use" if tool_calls else "end_turn",
+            "stop_sequence": None,
+            "usage": self._anthropic_usage(usage, usage[1]),
+        }
+
+    # --- streamed responses ---
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_event(self, payload, event=None):
+        data = "data: " + (payload if isinstance(payload, str) else json.dumps(payload)) + "\n\n"
+        if event:
+            data = f"event: {event}\n" + data
+        self._write_chunk(data.encode())
+
+    def _fragments(self, tokens, tool_calls, profile):
+        """Yield (kind, index, text) pieces with the configured inter-token delay"""
+        first = True
+        pieces = [("tool", i, args[j:j + profile["token_chars"]])
+                  for i, (_, _, args) in enumerate(tool_calls)
+                  for j in range(0, len(args), profile["token_chars"])]
+        for kind, index, text in pieces or [("text", 0, token) for token in tokens]:
+            if not first:
+                time.sleep(profile["inter_token_delay"])
+            first = False
+            yield kind, index, text
+
+    def _stream_openai(self, model, tokens, tool_calls, usage, profile, body):
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            return {"id": chunk_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        started = set()
+        role = {"role": "assistant"}
+        for kind, index, text in self._fragments(tokens, tool_calls, profile):
+            if kind == "text":
+                delta = {"content": text}
+            else:
+                call = {"index": index, "function": {"arguments": text}}
+                if index not in started:
+                    started.add(index)
+                    call.update(id=tool_calls[index][0], type="function")
+                    call["function"]["name"] = tool_calls[index][1]
+                delta = {"tool_calls": [call]}
+            self._send_event(chunk(dict(role, **delta)))
+            role = {}
+        self._send_event(chunk({}, "tool_calls" if tool_calls else "stop"))
+        if body.get("stream_options", {}).get("include_usage"):
+            final = chunk({})
+            final["choices"] = []
+            final["usage"] = self._openai_usage(usage)
+            self._send_event(final)
+        self._send_event("[DONE]")
+
+    def _stream_anthropic(self, model, tokens, tool_calls, usage, profile):
+        self._send_event({"type": "message_start", "message": {
+            "id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant", "content": [],
+            "model": model, "stop_reason": None, "stop_sequence": None,
+            "usage": self._anthropic_usage(usage, 1)}}, "message_start")
+
+        open_block = None
+        for kind, index, text in self._fragments(tokens, tool_calls, profile):
+            if open_block != index:
+                if open_block is not None:
+                    self._send_event({"type": "content_block_stop", "index": open_block}, "content_block_stop")
+                if kind == "text":
+                    block = {"type": "text", "text": ""}
+                else:
+                    block = {"type": "tool_use", "id": tool_calls[index][0], "name": tool_calls[index][1], "input": {}}
+                self._send_event({"type": "content_block_start", "index": index, "content_block": block}, "content_block_start")
+                open_block = index
+            if kind == "text":
+                delta = {"type": "text_delta", "text": text}
+            else:
+                delta = {"type": "input_json_delta", "partial_json": text}
+            self._send_event({"type": "content_block_delta", "index": index, "delta": delta}, "content_block_delta")
+        if open_block is not None:
+            self._send_event({"type": "content_block_stop", "index": open_block}, "content_block_stop")
+
+        self._send_event({"type": "message_delta",
+                          "delta": {"stop_reason": "tool_use" if tool_calls else "end_turn", "stop_sequence": None},
+                          "usage": {"output_tokens": usage[1]}}, "message_delta")
+        self._send_event({"type": "message_stop"}, "message_stop")
+
+
+# Function to start the mock server in a background thread
+def start_server(host="127.0.0.1", port=0):
+    """Start the server (once) and return its base URL"""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MockHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return "http://%s:%d" % _server.server_address[:2]
+
+
+# Function to map a "mock/..." model name to litellm arguments
+def model_kwargs(model):
+    """Return the model, api_base and api_key litellm needs to reach the mock server"""
+    _, wire_format, spec = model.split("/", 2)
+    if wire_format not in ("openai", "anthropic"):
+        raise ValueError(f"Mock models must look like mock/openai/<profile> or mock/anthropic/<profile>, got {model}")
+    parse_profile(spec)
+    base_url = start_server()
+    api_base = f"{base_url}/v1" if wire_format == "openai" else f"{base_url}/v1/messages"
+    return {"model": f"{wire_format}/{spec}", "api_base": api_base, "api_key": "mock-key"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mock OpenAI/Anthropic provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    print(f"Mock provider listening on http://{args.host}:{args.port}")
+    print(f"Profiles: {', '.join(PROFILES)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
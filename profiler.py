@@ -0,0 +1,301 @@
+"""
+Sampling CPU profiler and memory tracking for test runs (--profile).
+
+A background thread samples the stack of the thread running the event loop
+every few milliseconds. Each sample is put in one of four groups, decided by
+the innermost frame that isn't from the standard library:
+
+    harness   code in this repository (prompt building, JSON, base64, ...)
+    litellm   litellm and the libraries it drives (openai, httpx, pydantic, ...)
+    wait      the event loop waiting in select() for the network or a timer
+    other     only standard-library frames (event loop bookkeeping, GC, ...)
+
+The stacks are also written in collapsed form ("frame;frame;frame count"),
+which flamegraph.pl, speedscope and inferno read directly.
+
+tracemalloc runs alongside. On every tick the sampler reads the peak traced
+memory since the last tick and raises the peak of each running job (see
+job()) to it, so overlapping jobs share their peaks; run with --concurrency 1
+for a figure per job. A snapshot taken near the run's peak attributes live
+allocations to the same groups.
+
+tracemalloc makes every allocation slower (several times slower in
+litellm's pydantic-heavy code), so profiled timings aren't comparable with
+unprofiled ones and the CPU shares lean towards code that allocates a lot.
+With trace_frames=0 only the CPU is sampled, which costs little.
+"""
+import collections
+import contextlib
+import json
+import os
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+
+# Directory of this repository; frames from here count as harness
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Milliseconds between samples
+DEFAULT_INTERVAL_MS = 5
+
+# Frames kept per allocation (--profile-frames); more frames attribute more
+# allocations past the standard library but make every allocation slower
+DEFAULT_TRACE_FRAMES = 4
+
+# Minimum seconds between snapshots, and growth over the last one that triggers another
+SNAPSHOT_INTERVAL = 5.0
+SNAPSHOT_GROWTH = 1.25
+
+GROUPS = ("harness", "litellm", "wait", "other")
+
+_LIBRARY_DIRS = tuple({sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]})
+
+_OWN_FILES = (__file__, tracemalloc.__file__)
+
+# Profiler of the running --profile session, if any
+active = None
+
+
+def _kind(filename):
+    """Return "harness", "litellm" or None (standard library and anything else)"""
+    if filename.startswith(_LIBRARY_DIRS):
+        return "litellm"
+    if filename.startswith(SCRIPT_DIR) and filename != __file__:
+        return "harness"
+    return None
+
+
+def _short(filename):
+    """Path relative to the repository or to site-packages, when it's in one of them"""
+    if filename.startswith(SCRIPT_DIR):
+        return os.path.relpath(filename, SCRIPT_DIR)
+    return filename.rpartition("site-packages" + os.sep)[2]
+
+
+def _is_wait(code):
+    return code.co_name == "select" and code.co_filename.endswith("selectors.py")
+
+
+class Profiler:
+    """Samples one thread's stacks and tracks memory per job between start() and stop()"""
+
+    def __init__(self, interval_ms=DEFAULT_INTERVAL_MS, trace_frames=DEFAULT_TRACE_FRAMES, thread_id=None):
+        self.interval = interval_ms / 1000
+        self.trace_frames = trace_frames
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = collections.Counter()
+        self.groups = collections.Counter()
+        # (group, function) of the frame that decided each sample's group
+        self.functions = collections.Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self.jobs = {}
+        self.peaks = {}
+        self.peak_bytes = 0
+        self.snapshot = None
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._snapshot_bytes = 0
+        self._snapshot_time = 0.0
+
+    def start(self):
+        if self.trace_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+        if self.trace_frames:
+            self._track_memory()
+            self._take_snapshot(force=self.snapshot is None)
+            tracemalloc.stop()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            name = f"{code.co_name} ({_short(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+            label = self._labels[code] = (name, _kind(code.co_filename))
+        return label
+
+    def _sample(self, frame):
+        names = []
+        group = function = None
+        if _is_wait(frame.f_code):
+            group, function = "wait", "select"
+        while frame is not None:
+            name, kind = self._label(frame.f_code)
+            names.append(name)
+            if group is None and kind is not None:
+                group, function = kind, name
+            frame = frame.f_back
+        group = group or "other"
+        self.stacks[";".join(reversed(names))] += 1
+        self.groups[group] += 1
+        self.functions[group, function or names[0]] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._sample(frame)
+            del frame
+            if self.trace_frames:
+                self._track_memory()
+
+    def _track_memory(self):
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        with self._lock:
+            self.peak_bytes = max(self.peak_bytes, peak)
+            for entry in self.jobs.values():
+                entry["peak"] = max(entry["peak"], peak)
+        self._take_snapshot()
+
+    def _take_snapshot(self, force=False):
+        """Snapshot live allocations when memory has grown past the last snapshot"""
+        current = tracemalloc.get_traced_memory()[0]
+        now = time.perf_counter()
+        if force or (current > self._snapshot_bytes * SNAPSHOT_GROWTH
+                     and now - self._snapshot_time >= SNAPSHOT_INTERVAL):
+            self.snapshot = tracemalloc.take_snapshot()
+            self._snapshot_bytes = current
+            self._snapshot_time = now
+
+    @contextlib.contextmanager
+    def job(self, test_name, model):
+        if not self.trace_frames:
+            yield
+            return
+        start = tracemalloc.get_traced_memory()[0]
+        entry = {"start": start, "peak": start}
+        with self._lock:
+            self.jobs[id(entry)] = entry
+        try:
+            yield
+        finally:
+            with self._lock:
+                del self.jobs[id(entry)]
+                peak = max(entry["peak"], tracemalloc.get_traced_memory()[1])
+                self.peak_bytes = max(self.peak_bytes, peak)
+                totals = self.peaks.setdefault((test_name, model), {"runs": 0, "peak_bytes": 0, "growth_bytes": 0})
+                totals["runs"] += 1
+                totals["peak_bytes"] = max(totals["peak_bytes"], peak)
+                totals["growth_bytes"] = max(totals["growth_bytes"], peak - start)
+
+    def allocations(self, limit=15):
+        """Return bytes live at the snapshot per group, and the largest allocation sites"""
+        groups = collections.Counter()
+        sites = collections.Counter()
+        if self.snapshot is None:
+            return groups, []
+        # Snapshot.statistics() and filter_traces() take far too long on a large
+        # snapshot, so traces are classified directly, once per distinct traceback
+        owners = {}
+        for trace in self.snapshot.traces:
+            owner = owners.get(trace.traceback)
+            if owner is None:
+                if trace.traceback[-1].filename in _OWN_FILES:
+                    # Allocated by the profiler or by tracemalloc itself
+                    owners[trace.traceback] = False
+                    continue
+                group, site = "other", trace.traceback[-1]
+                for frame in reversed(trace.traceback):
+                    kind = _kind(frame.filename)
+                    if kind is not None:
+                        group, site = kind, frame
+                        break
+                owner = owners[trace.traceback] = (group, f"{_short(site.filename)}:{site.lineno}")
+            elif not owner:
+                continue
+            groups[owner[0]] += trace.size
+            sites[owner] += trace.size
+        return groups, sites.most_common(limit)
+
+    def report(self):
+        groups, sites = self.allocations()
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "seconds": self.elapsed,
+            "cpu": {group: self.groups[group] / self.samples if self.samples else 0.0 for group in GROUPS},
+            "top_functions": [{"group": group, "function": function, "samples": count}
+                              for (group, function), count in self.functions.most_common(30)],
+            "trace_frames": self.trace_frames,
+            "peak_bytes": self.peak_bytes,
+            "snapshot_bytes": {group: groups[group] for group in ("harness", "litellm", "other")},
+            "top_allocations": [{"group": group, "site": site, "bytes": size} for (group, site), size in sites],
+            "jobs": [dict(test=test_name, model=model, **totals)
+                     for (test_name, model), totals in sorted(self.peaks.items())],
+        }
+
+    # Function to write the collapsed stacks for a flame graph
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+# Function to time and measure one job (a no-op unless a profile is running)
+def job(test_name, model):
+    return active.job(test_name, model) if active is not None else contextlib.nullcontext()
+
+
+# Function to profile everything run inside the block
+@contextlib.contextmanager
+def profile(interval_ms=DEFAULT_INTERVAL_MS, trace_frames=DEFAULT_TRACE_FRAMES):
+    global active
+    active = Profiler(interval_ms, trace_frames)
+    active.start()
+    try:
+        yield active
+    finally:
+        active.stop()
+        active = None
+
+
+def _mb(size):
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+# Function to print where the time and memory went
+def print_report(report):
+    print(f"\n=== Profile ({report['samples']} samples every {report['interval_ms']:g} ms "
+          f"over {report['seconds']:.1f} seconds) ===")
+    print("CPU: " + ", ".join(f"{group} {report['cpu'][group] * 100:.0f}%" for group in GROUPS))
+    print(f"\n{'group':<8} {'samples':>7}  function")
+    for entry in [e for e in report["top_functions"] if e["group"] != "wait"][:12]:
+        print(f"{entry['group']:<8} {entry['samples']:>7}  {entry['function']}")
+
+    if not report["trace_frames"]:
+        return
+    print(f"\nPeak traced memory: {_mb(report['peak_bytes'])}; live near the peak: "
+          + ", ".join(f"{group} {_mb(size)}" for group, size in report["snapshot_bytes"].items()))
+    for entry in report["top_allocations"][:8]:
+        print(f"{entry['group']:<8} {_mb(entry['bytes']):>9}  {entry['site']}")
+
+    print(f"\n{'test':<22} {'model':<40} {'runs':>4} {'peak':>9} {'growth':>9}")
+    for entry in report["jobs"]:
+        print(f"{entry['test']:<22} {entry['model']:<40} {entry['runs']:>4} {_mb(entry['peak_bytes']):>9} "
+              f"{_mb(entry['growth_bytes']):>9}")
+
+
+# Function to write the report and flame-graph stacks under results/
+def save(profiler, results_dir, run_id):
+    """Return the paths of the JSON report and the collapsed-stack file"""
+    os.makedirs(results_dir, exist_ok=True)
+    report_path = os.path.join(results_dir, f"profile-{run_id}.json")
+    folded_path = os.path.join(results_dir, f"profile-{run_id}.folded")
+    report = profiler.report()
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    profiler.write_folded(folded_path)
+    return report, report_path, folded_path
@@ -0,0 +1,222 @@
+"""
+Prompt-caching benchmark: one cold request followed by warm requests that
+share the same long prefix (docs/llm.txt), per model.
+
+The document goes in the system message, with the question that changes
+from request to request after it. Anthropic models get a cache_control
+breakpoint on the document; OpenAI caches long prefixes automatically. A
+per-run marker at the start of the prefix makes sure the first request
+really is cold, even if the same document was cached by an earlier run.
+
+Each request is streamed and records time to first token, the cache-read
+and cache-write token counts from the usage block, and its cost. The
+report compares the warm requests with the cold one.
+
+    python prompt_caching.py --warm 5
+    python prompt_caching.py --models mock/anthropic/prefill mock/openai/prefill --tokens 32k
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+
+import cost
+import harness
+import long_context
+import results
+from latency import StreamTimer
+from stream_consumer import StreamConsumer
+
+# Source text for the shared prefix
+LONG_TEXT_PATH = "docs/llm.txt"
+
+# Models tested when none are given (same as long-context-test.py)
+DEFAULT_MODELS = [
+    "openai/gpt-4o",
+    "anthropic/claude-3-5-sonnet-latest"
+]
+
+# Providers that only cache at explicit cache_control breakpoints
+EXPLICIT_CACHE_PROVIDERS = {"anthropic", "bedrock", "vertex_ai"}
+
+# Questions asked after the shared prefix, in turn
+QUESTIONS = [
+    "Give a 3-bullet summary of the document.",
+    "What is the main topic of the document? Answer in one sentence.",
+    "List three terms the document defines.",
+    "Which section of the document is the longest?",
+    "Suggest a better title for the document.",
+]
+
+
+# Shared prefix: a per-run marker, the instruction and the document
+SYSTEM_TEMPLATE = "[run {run_id}]\nAnswer questions about the following document.\n\n{text}"
+
+
+# Function to build the messages for one request
+def build_messages(model, system_text, question):
+    block = {"type": "text", "text": system_text}
+    # Mock models cache like the provider whose wire format they speak
+    provider = model.split("/")[1] if model.startswith("mock/") else harness.provider_of(model)
+    if provider in EXPLICIT_CACHE_PROVIDERS:
+        block["cache_control"] = {"type": "ephemeral"}
+    return [
+        {"role": "system", "content": [block]},
+        {"role": "user", "content": question},
+    ]
+
+
+# Function to build the shared system text, optionally at an exact size
+def build_system_text(model, target_tokens):
+    """
+    Return SYSTEM_TEMPLATE with the document filled in. With target_tokens,
+    the document is cut so the whole system text is that many tokens.
+    """
+    # The marker is unique per run, so the cold request can't hit a prefix cached by an earlier run
+    template = SYSTEM_TEMPLATE.format(run_id=results.RUN_ID, text="{text}")
+    if target_tokens:
+        return long_context.build_document(model, LONG_TEXT_PATH, target_tokens, template)
+    with open(LONG_TEXT_PATH, encoding="utf-8") as file:
+        return template.format(text=file.read())
+
+
+# Function to send one request and record its timing, cache use and cost
+async def measure(model, messages, max_tokens):
+    """Return ok, ttft_ms, total_ms, prompt/cache token counts and cost for one streamed request"""
+    point = {"ok": False}
+    timer = StreamTimer()
+    try:
+        timer.start()
+        response = await harness.acompletion(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            max_tokens=max_tokens
+        )
+        stream = await StreamConsumer(timer, echo="off").consume(response)
+    except Exception as e:
+        point.update(error=str(e)[:300], error_type=type(e).__name__)
+        return point
+
+    usage = stream.usage
+    point.update(ok=True, ttft_ms=stream.stats["ttft_ms"], total_ms=stream.stats["total_ms"])
+    if usage:
+        cache_read, cache_write = cost.cache_tokens(usage)
+        point.update(prompt_tokens=usage.prompt_tokens, cache_read_tokens=cache_read,
+                     cache_write_tokens=cache_write, cost=cost.call_cost(model, usage))
+    return point
+
+
+# Function to run the cold request and then the warm ones for a model
+async def run_model(model, warm, target_tokens, max_tokens):
+    system_text = await asyncio.to_thread(build_system_text, model, target_tokens)
+    requests = []
+    for index in range(warm + 1):
+        messages = build_messages(model, system_text, QUESTIONS[index % len(QUESTIONS)])
+        point = await measure(model, messages, max_tokens)
+        point["kind"] = "cold" if index == 0 else "warm"
+        requests.append(point)
+        if point["ok"]:
+            print(f"{model:<40} {point['kind']:<5} ttft {point['ttft_ms']:>7.0f} ms  "
+                  f"cache read {point.get('cache_read_tokens', 0):>7}  write {point.get('cache_write_tokens', 0):>7}",
+                  flush=True)
+        else:
+            print(f"{model:<40} {point['kind']:<5} error: {point['error'][:80]}", flush=True)
+            break
+    return {"requests": requests, **summarize(requests)}
+
+
+def _mean(values):
+    return statistics.fmean(values) if values else None
+
+
+def _change(new, old):
+    return new / old - 1 if new is not None and old else None
+
+
+# Function to compare the warm requests with the cold one
+def summarize(requests):
+    cold = requests[0] if requests and requests[0]["ok"] else None
+    warm = [r for r in requests[1:] if r["ok"]]
+    if cold is None or not warm:
+        return {"cold_ttft_ms": cold and cold["ttft_ms"], "warm_requests": len(warm)}
+    warm_ttft = statistics.median(r["ttft_ms"] for r in warm)
+    costs = [r["cost"] for r in warm if r.get("cost") is not None]
+    warm_cost = _mean(costs)
+    prompt_tokens = sum(r.get("prompt_tokens") or 0 for r in warm)
+    return {
+        "warm_requests": len(warm),
+        "cold_ttft_ms": cold["ttft_ms"],
+        "warm_ttft_p50_ms": warm_ttft,
+        "ttft_change": _change(warm_ttft, cold["ttft_ms"]),
+        "cold_cost": cold.get("cost"),
+        "warm_cost_mean": warm_cost,
+        "cost_change": _change(warm_cost, cold.get("cost")),
+        "cold_cache_write_tokens": cold.get("cache_write_tokens", 0),
+        "warm_cache_hits": sum(1 for r in warm if r.get("cache_read_tokens")),
+        "warm_cached_fraction": sum(r.get("cache_read_tokens", 0) for r in warm) / prompt_tokens
+        if prompt_tokens else None,
+    }
+
+
+def _format(value, spec, suffix=""):
+    return "-" if value is None else f"{value:{spec}}{suffix}"
+
+
+def _percent(value, sign="+"):
+    return "-" if value is None else f"{value * 100:{sign}.0f}%"
+
+
+def print_report(report):
+    print("\n=== Prompt caching: warm vs cold ===")
+    print(f"{'model':<40} {'cold ttft':>9} {'warm p50':>9} {'change':>7} {'cold $':>9} {'warm $':>9} "
+          f"{'change':>7} {'hits':>6} {'cached':>7}")
+    for model, summary in report.items():
+        hits = f"{summary.get('warm_cache_hits', 0)}/{summary['warm_requests']}"
+        print(f"{model:<40} {_format(summary.get('cold_ttft_ms'), '.0f', ' ms'):>9} "
+              f"{_format(summary.get('warm_ttft_p50_ms'), '.0f', ' ms'):>9} "
+              f"{_percent(summary.get('ttft_change')):>7} "
+              f"{_format(summary.get('cold_cost'), '.5f'):>9} {_format(summary.get('warm_cost_mean'), '.5f'):>9} "
+              f"{_percent(summary.get('cost_change')):>7} "
+              f"{hits:>6} {_percent(summary.get('warm_cached_fraction'), ''):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold and warm requests that share a long prompt prefix")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, help="Models to test")
+    parser.add_argument("--warm", type=int, default=5, help="Warm requests after the cold one (default: 5)")
+    parser.add_argument("--tokens", type=long_context.parse_size,
+                        help="Size of the shared prefix, e.g. 32k (default: the whole of docs/llm.txt)")
+    parser.add_argument("--max-tokens", type=int, default=100, help="max_tokens for each response")
+    parser.add_argument("--output", help="Output path (default: results/prompt-caching-<run id>.json)")
+    parser.add_argument("--budget", type=float, metavar="USD",
+                        help="Stop sending requests once this much has been spent (priced by litellm)")
+    args = parser.parse_args()
+    if args.warm < 1:
+        parser.error("--warm must be at least 1")
+    cost.set_budget(args.budget)
+
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
+
+    async def run_all():
+        # Models run side by side; each model's requests stay in order
+        reports = await asyncio.gather(*(run_model(model, args.warm, args.tokens, args.max_tokens)
+                                         for model in args.models))
+        return dict(zip(args.models, reports))
+
+    report = asyncio.run(run_all())
+    print_report(report)
+
+    os.makedirs(results.RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(results.RESULTS_DIR, f"prompt-caching-{results.RUN_ID}.json")
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump({"run_id": results.RUN_ID, "warm": args.warm, "models": report}, file, indent=2)
+    cost.print_summary()
+    print(f"\nReport written to {output}")
+
+
+if __name__ == "__main__":
+    main()
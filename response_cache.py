@@ -0,0 +1,176 @@
+"""
+Opt-in on-disk cache of model responses for repeatable test runs.
+
+Responses are stored as JSON under .cache/responses/, keyed by a SHA-256 of
+the model name, messages and request parameters. Streamed responses are
+stored as their chunk sequence together with each chunk's arrival time, so
+a replay can either return all chunks at once or reproduce the original
+pacing. The cache is trimmed to max_bytes by evicting the least recently
+used entries, and entries older than ttl seconds are ignored. Eviction walks
+the whole directory, so it runs on the first write and then after every
+EVICT_EVERY_BYTES written rather than on each write. Several processes
+(matrix --workers) can share the cache: files that another process has
+already removed are skipped.
+
+Enable it with `python run-tests.py --cache` or RESPONSE_CACHE=1.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+# Where cached responses are written
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "responses")
+
+# Bytes this process writes between eviction passes
+EVICT_EVERY_BYTES = 16 * 1024 * 1024
+
+# Request arguments that don't change the response
+IGNORED_PARAMS = {"api_key", "api_base", "max_retries"}
+
+enabled = os.getenv("RESPONSE_CACHE", "") not in ("", "0")
+ttl = 7 * 24 * 3600
+max_bytes = 500 * 1024 * 1024
+replay_timing = False
+
+# Bytes written since the last eviction pass (None until the first one)
+_written_since_evict = None
+
+
+# Function to switch the cache on and change its limits
+def configure(enable=True, ttl_seconds=None, size_limit=None, replay=None):
+    global enabled, ttl, max_bytes, replay_timing
+    enabled = enable
+    if ttl_seconds is not None:
+        ttl = ttl_seconds
+    if size_limit is not None:
+        max_bytes = size_limit
+    if replay is not None:
+        replay_timing = replay
+
+
+def _to_json(value):
+    """Serialize litellm/pydantic objects (e.g. raw tool_calls) inside messages"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+# Function to build the cache key for a request
+def make_key(model, params):
+    request = {key: value for key, value in params.items() if key not in IGNORED_PARAMS}
+    request["model"] = model
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=_to_json)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _path(key):
+    return os.path.join(CACHE_DIR, key[:2], key + ".json")
+
+
+# Function to look up a cached response
+def get(key):
+    """Return the cached response (or an async chunk iterator for streams), or None"""
+    path = _path(key)
+    try:
+        with open(path, encoding="utf-8") as file:
+            entry = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    try:
+        if time.time() - entry["created"] > ttl:
+            os.remove(path)
+            return None
+        # Touching the file records the access for LRU eviction
+        os.utime(path)
+    except FileNotFoundError:
+        # Evicted by another process since it was read; the entry is still usable
+        pass
+    if "chunks" in entry:
+        return _replay(entry["chunks"])
+    import litellm
+    return litellm.ModelResponse(**entry["response"])
+
+
+async def _replay(chunks):
+    """Yield cached stream chunks, optionally at their original offsets"""
+    import litellm
+    start_ns = time.perf_counter_ns()
+    for offset_ns, data in chunks:
+        if replay_timing:
+            delay = (start_ns + offset_ns - time.perf_counter_ns()) / 1e9
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield litellm.ModelResponseStream(**data)
+
+
+# Function to store a response; streams are wrapped and stored once consumed
+def put(key, response, started_ns):
+    """
+    Store response under key and return what the caller should use instead.
+
+    For a stream that is a wrapper which passes chunks through as they
+    arrive and writes the entry when the stream has been read to the end.
+    started_ns is the perf_counter_ns() reading taken before the request.
+    """
+    if hasattr(response, "model_dump"):
+        _write(key, {"response": response.model_dump()})
+        return response
+    return _record(key, response, started_ns)
+
+
+async def _record(key, stream, started_ns):
+    chunks = []
+    async for chunk in stream:
+        chunks.append((time.perf_counter_ns() - started_ns, chunk.model_dump()))
+        yield chunk
+    _write(key, {"chunks": chunks})
+
+
+def _write(key, entry):
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry["created"] = time.time()
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(entry, file, default=_to_json)
+        size = file.tell()
+    os.replace(temp_path, path)
+    _maybe_evict(size)
+
+
+def _maybe_evict(size):
+    global _written_since_evict
+    if _written_since_evict is not None and _written_since_evict + size < EVICT_EVERY_BYTES:
+        _written_since_evict += size
+        return
+    _written_since_evict = 0
+    evict()
+
+
+# Function to delete least recently used entries until under max_bytes
+def evict():
+    entries = []
+    total = 0
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".tmp"):
+                # Still being written, possibly by another process
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Already evicted by another process
+            pass
+        total -= size
@@ -0,0 +1,50 @@
+"""
+Structured result records written by the tests.
+
+Records are appended as one JSON object per line under results/, tagged
+with the run they belong to so several runs can share one file.
+"""
+import functools
+import importlib.metadata
+import json
+import os
+import subprocess
+import time
+
+# Directory result files are written to
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Identifies every record written by this process
+RUN_ID = time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+
+
+# Function to append one record to a JSONL file under results/
+def append_jsonl(filename, record):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    record = dict(record, run_id=RUN_ID, timestamp=time.time())
+    with open(os.path.join(RESULTS_DIR, filename), "a", encoding="utf-8") as file:
+        file.write(json.dumps(record) + "\n")
+
+
+# Function to find the git revision of the checkout the tests run from
+@functools.lru_cache(maxsize=None)
+def git_revision():
+    """Return the short commit hash (with "-dirty" if there are local changes), or None"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=directory,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ("-dirty" if status.strip() else "")
+
+
+# Function to look up an installed package's version without importing it
+@functools.lru_cache(maxsize=None)
+def package_version(name):
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
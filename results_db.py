@@ -0,0 +1,272 @@
+"""
+Historical results database: the metrics records of every run in SQLite,
+for latency trends and regression checks across runs.
+
+`ingest` copies new records from results/metrics.jsonl into
+results/results.db, indexed by model, test, day and git revision. `report`
+ingests first, prints daily latency trends per model, and compares the
+latest run (or --current) against a baseline with a one-sided Mann-Whitney
+U test. Slowdowns that are statistically significant and larger than
+--min-change are flagged, and the command exits with status 1 so it can
+gate CI. Records with responses from the response cache (cache_hits > 0)
+are stored but left out of the trends and comparisons, since their
+latencies say nothing about the provider.
+
+    python results_db.py ingest
+    python results_db.py report --days 14
+    python results_db.py report --baseline-rev 1a2b3c4 --alpha 0.01
+    python results_db.py runs
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import metrics
+import results
+from latency import mann_whitney_u, percentile
+
+# Where the database lives
+DB_PATH = os.path.join(results.RESULTS_DIR, "results.db")
+
+# Fewer samples than this on either side are reported but not tested
+MIN_SAMPLES = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    run_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    day TEXT NOT NULL,
+    git_rev TEXT,
+    litellm_version TEXT,
+    test TEXT NOT NULL,
+    model TEXT NOT NULL,
+    provider TEXT,
+    params TEXT NOT NULL DEFAULT '',
+    ok INTEGER NOT NULL,
+    error_type TEXT,
+    latency REAL,
+    ttft_ms REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    retries INTEGER,
+    cache_hits INTEGER,
+    record TEXT NOT NULL,
+    UNIQUE (run_id, timestamp, test, model)
+);
+CREATE INDEX IF NOT EXISTS samples_model_test_day ON samples (model, test, day);
+CREATE INDEX IF NOT EXISTS samples_day ON samples (day);
+CREATE INDEX IF NOT EXISTS samples_git_rev ON samples (git_rev);
+CREATE INDEX IF NOT EXISTS samples_run ON samples (run_id);
+CREATE TABLE IF NOT EXISTS ingested (path TEXT PRIMARY KEY, offset INTEGER NOT NULL);
+"""
+
+COLUMNS = ["run_id", "timestamp", "day", "git_rev", "litellm_version", "test", "model", "provider", "params",
+           "ok", "error_type", "latency", "ttft_ms", "prompt_tokens", "completion_tokens", "retries", "cache_hits", "record"]
+
+# Only records with every response from the provider count as latency samples
+UNCACHED = "COALESCE(cache_hits, 0) = 0"
+
+
+# Function to open (and if needed create) the database
+def connect(path=DB_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    if "cache_hits" not in [column[1] for column in db.execute("PRAGMA table_info(samples)")]:
+        # Databases created before cache_hits was stored
+        with db:
+            db.execute("ALTER TABLE samples ADD COLUMN cache_hits INTEGER")
+            db.execute("UPDATE samples SET cache_hits = json_extract(record, '$.cache_hits')")
+    return db
+
+
+def _row(record):
+    return (
+        record["run_id"], record["timestamp"], time.strftime("%Y-%m-%d", time.localtime(record["timestamp"])),
+        record.get("git_rev"), record.get("litellm_version"), record["test"], record["model"],
+        record.get("provider"), record.get("params", ""), int(bool(record.get("ok"))), record.get("error_type"),
+        record.get("latency", record.get("wall_time")), record.get("ttft_ms"), record.get("prompt_tokens"),
+        record.get("completion_tokens"), record.get("retries"), record.get("cache_hits"), json.dumps(record),
+    )
+
+
+# Function to copy new records from a metrics JSONL file into the database
+def ingest(db, jsonl_path):
+    """
+    Insert the records added to jsonl_path since the last ingest and return
+    how many were new. The file offset reached is stored, so only the new
+    tail of the file is read; a file that got shorter is read from the start.
+    """
+    if not os.path.exists(jsonl_path):
+        return 0
+    path = os.path.abspath(jsonl_path)
+    row = db.execute("SELECT offset FROM ingested WHERE path = ?", (path,)).fetchone()
+    offset = row[0] if row and row[0] <= os.path.getsize(path) else 0
+    with open(path, "rb") as file:
+        file.seek(offset)
+        data = file.read()
+    # Leave a partly written last line for the next ingest
+    complete = data[:data.rfind(b"\n") + 1]
+    rows = [_row(json.loads(line)) for line in complete.splitlines() if line.strip()]
+    with db:
+        before = db.total_changes
+        db.executemany(f"INSERT OR IGNORE INTO samples ({', '.join(COLUMNS)}) "
+                       f"VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+        added = db.total_changes - before
+        db.execute("INSERT OR REPLACE INTO ingested (path, offset) VALUES (?, ?)", (path, offset + len(complete)))
+    return added
+
+
+# Function to list recent runs
+def list_runs(db, limit=20):
+    return db.execute(
+        "SELECT run_id, MIN(timestamp), git_rev, litellm_version, COUNT(*), SUM(ok) FROM samples "
+        "GROUP BY run_id ORDER BY MIN(timestamp) DESC LIMIT ?", (limit,)
+    ).fetchall()
+
+
+# Function to compute daily latency percentiles per model and test
+def trends(db, days, models=None):
+    """Return {(model, test): [(day, count, p50, p90, error rate), ...]} for the last `days` days"""
+    since = time.strftime("%Y-%m-%d", time.localtime(time.time() - days * 86400))
+    query = f"SELECT model, test, day, ok, latency FROM samples WHERE day >= ? AND {UNCACHED}"
+    values = [since]
+    if models:
+        query += f" AND model IN ({', '.join('?' * len(models))})"
+        values += models
+    grouped = {}
+    for model, test, day, ok, latency in db.execute(query + " ORDER BY day", values):
+        grouped.setdefault((model, test), {}).setdefault(day, []).append(latency if ok else None)
+    series = {}
+    for key, by_day in sorted(grouped.items()):
+        series[key] = []
+        for day, samples in by_day.items():
+            latencies = [s for s in samples if s is not None]
+            series[key].append((day, len(samples), percentile(latencies, 50), percentile(latencies, 90),
+                                1 - len(latencies) / len(samples)))
+    return series
+
+
+def _latencies(db, where, values):
+    grouped = {}
+    for test, model, params, latency in db.execute(
+            f"SELECT test, model, params, latency FROM samples "
+            f"WHERE ok = 1 AND latency IS NOT NULL AND {UNCACHED} AND {where}",
+            values):
+        grouped.setdefault((test, model, params), []).append(latency)
+    return grouped
+
+
+# Function to compare a run's latencies with a baseline
+def compare(db, current_run, baseline_where, baseline_values, alpha=0.05, min_change=0.1):
+    """
+    Return one row per (test, model, params) in current_run with the sample
+    counts, baseline and current p50, relative change, p-value and whether
+    it counts as a regression (p < alpha and p50 slower by > min_change).
+    """
+    current = _latencies(db, "run_id = ?", [current_run])
+    baseline = _latencies(db, f"run_id != ? AND {baseline_where}", [current_run] + list(baseline_values))
+    rows = []
+    for key, samples in sorted(current.items()):
+        before = baseline.get(key, [])
+        old, new = percentile(before, 50), percentile(samples, 50)
+        change = new / old - 1 if old else None
+        p_value = None
+        if len(samples) >= MIN_SAMPLES and len(before) >= MIN_SAMPLES:
+            _, p_value = mann_whitney_u(samples, before)
+        regression = p_value is not None and p_value < alpha and change is not None and change > min_change
+        rows.append({"test": key[0], "model": key[1], "params": key[2], "n": len(samples), "baseline_n": len(before),
+                     "baseline_p50": old, "p50": new, "change": change, "p_value": p_value,
+                     "regression": regression})
+    return rows
+
+
+def print_trends(series):
+    print("=== Daily latency trends ===")
+    print(f"{'model':<40} {'test':<22} {'day':<10} {'n':>5} {'p50':>7} {'p90':>7} {'errors':>7}")
+    for (model, test), days in series.items():
+        for day, count, p50, p90, error_rate in days:
+            p50 = f"{p50:.3f}" if p50 is not None else "-"
+            p90 = f"{p90:.3f}" if p90 is not None else "-"
+            print(f"{model:<40} {test:<22} {day:<10} {count:>5} {p50:>7} {p90:>7} {error_rate * 100:>6.1f}%")
+
+
+def print_comparison(rows, current_run, baseline_label):
+    print(f"\n=== Run {current_run} vs {baseline_label} ===")
+    print(f"{'test':<22} {'model':<40} {'n':>4} {'base n':>6} {'base p50':>8} {'p50':>7} {'change':>7} {'p':>8}")
+    for r in rows:
+        base = f"{r['baseline_p50']:.3f}" if r["baseline_p50"] is not None else "-"
+        change = f"{r['change'] * 100:+.0f}%" if r["change"] is not None else "-"
+        p_value = f"{r['p_value']:.4f}" if r["p_value"] is not None else "-"
+        flag = "  REGRESSION" if r["regression"] else ""
+        label = r["model"] + (f" {r['params']}" if r["params"] else "")
+        print(f"{r['test']:<22} {label:<40} {r['n']:>4} {r['baseline_n']:>6} {base:>8} {r['p50']:>7.3f} "
+              f"{change:>7} {p_value:>8}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store results across runs and check them for regressions")
+    parser.add_argument("--db", default=DB_PATH, help="Database file (default: results/results.db)")
+    parser.add_argument("--input", default=os.path.join(results.RESULTS_DIR, metrics.METRICS_FILE),
+                        help="Metrics records to ingest (default: results/metrics.jsonl)")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("ingest", help="Copy new metrics records into the database")
+    subcommands.add_parser("runs", help="List recent runs")
+    report = subcommands.add_parser("report", help="Print latency trends and regressions")
+    report.add_argument("--days", type=int, default=14, help="Days of history for trends and the baseline")
+    report.add_argument("--models", nargs="+", help="Only show trends for these models")
+    report.add_argument("--current", help="Run to check (default: the latest run)")
+    baseline = report.add_mutually_exclusive_group()
+    baseline.add_argument("--baseline", help="Compare against this run id")
+    baseline.add_argument("--baseline-rev", help="Compare against all runs at this git revision")
+    report.add_argument("--alpha", type=float, default=0.05, help="Significance level (default: 0.05)")
+    report.add_argument("--min-change", type=float, default=0.1,
+                        help="Smallest p50 slowdown that counts as a regression (default: 0.1 = 10%%)")
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    added = ingest(db, args.input)
+    if args.command == "ingest":
+        print(f"Added {added} records to {args.db}")
+        return
+
+    if args.command == "runs":
+        print(f"{'run':<24} {'started':<19} {'git rev':<14} {'litellm':<10} {'runs':>5} {'ok':>5}")
+        for run_id, started, git_rev, version, count, ok in list_runs(db):
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started))
+            print(f"{run_id:<24} {started:<19} {git_rev or '-':<14} {version or '-':<10} {count:>5} {ok:>5}")
+        return
+
+    print_trends(trends(db, args.days, args.models))
+
+    current = args.current or (list_runs(db, 1) or [[None]])[0][0]
+    if current is None:
+        print("\nNo runs recorded yet")
+        return
+    if db.execute("SELECT 1 FROM samples WHERE run_id = ? LIMIT 1", (current,)).fetchone() is None:
+        report.error(f"no samples recorded for run {current}")
+    if args.baseline:
+        where, values, label = "run_id = ?", [args.baseline], f"run {args.baseline}"
+    elif args.baseline_rev:
+        where, values, label = "git_rev = ?", [args.baseline_rev], f"revision {args.baseline_rev}"
+    else:
+        # Earlier runs from the --days before the current run started
+        started = db.execute("SELECT MIN(timestamp) FROM samples WHERE run_id = ?", (current,)).fetchone()[0]
+        where, values = "timestamp >= ? AND timestamp < ?", [started - args.days * 86400, started]
+        label = f"the {args.days} days before it"
+    rows = compare(db, current, where, values, args.alpha, args.min_change)
+    print_comparison(rows, current, label)
+
+    regressions = [r for r in rows if r["regression"]]
+    if regressions:
+        print(f"\n{len(regressions)} significant regression(s) (p < {args.alpha}, p50 slower by more than "
+              f"{args.min_change * 100:.0f}%)")
+        sys.exit(1)
+    print("\nNo significant regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Retries, rate limiting and circuit breaking shared by every test call.
+
+harness.acompletion() sends each request through call_with_retries(), so
+all tests running concurrently share one set of per-provider limits:
+
+- token buckets for requests and tokens per minute (off unless configured
+  with set_rate_limit()),
+- jittered exponential backoff for retryable errors that uses the server's
+  Retry-After hint when there is one,
+- a circuit breaker that stops sending to a provider for a while after
+  repeated failures instead of piling more retries onto it.
+"""
+import asyncio
+import email.utils
+import random
+import time
+
+# HTTP statuses worth retrying (529 is Anthropic's "overloaded")
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# litellm exception classes worth retrying
+RETRYABLE_ERRORS = {"RateLimitError", "InternalServerError", "ServiceUnavailableError",
+                    "Timeout", "APIConnectionError"}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+class RetryPolicy:
+    """How often and how long to back off between attempts"""
+
+    def __init__(self, max_retries=5, base_delay=1.0, max_delay=60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt, hint=None):
+        """Delay before retry number attempt (1-based), preferring the server's hint"""
+        if hint is not None:
+            return min(hint, self.max_delay) + random.uniform(0, 0.1 * self.base_delay)
+        # "Equal jitter": half the exponential delay plus a random share of the other half
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at rate_per_minute, holding at most one minute's worth.
+
+    acquire() reserves tokens straight away, letting the balance go negative,
+    and then sleeps until the refill covers the debt. Waiters are therefore
+    served in arrival order without needing a lock.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        self._refill()
+        self.tokens -= amount
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+    def adjust(self, amount):
+        """Return (positive) or charge (negative) tokens once the real cost is known"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `cooldown` seconds. After that one trial call is let through
+    (half-open); success closes the circuit again, failure re-opens it.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def before_call(self, provider):
+        if self.opened_at is None:
+            return
+        remaining = self.opened_at + self.cooldown - time.monotonic()
+        if remaining > 0 or self.trial_running:
+            raise CircuitOpenError(f"Circuit open for {provider}: {self.failures} consecutive failures, "
+                                   f"retrying in {max(remaining, 0):.1f} seconds")
+        self.trial_running = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def cancel_trial(self):
+        """The call was cancelled before it got an answer; let the next call be the trial"""
+        self.trial_running = False
+
+
+# Shared state, one entry per provider
+policy = RetryPolicy()
+_request_buckets = {}
+_token_buckets = {}
+_breakers = {}
+
+
+# Function to set requests/tokens per minute for a provider
+def set_rate_limit(provider, rpm=None, tpm=None):
+    if rpm:
+        _request_buckets[provider] = TokenBucket(rpm)
+    if tpm:
+        _token_buckets[provider] = TokenBucket(tpm)
+
+
+def _breaker(provider):
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker()
+    return _breakers[provider]
+
+
+# Function to decide whether an error is worth retrying
+def is_retryable(error):
+    status = getattr(error, "status_code", None)
+    if status in RETRYABLE_STATUS:
+        return True
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return "overloaded" in str(error).lower()
+
+
+# Function to tell rate-limit errors (429) from other retryable errors
+def is_rate_limit(error):
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+# Function to read a Retry-After hint (in seconds) from a litellm error
+def retry_after(error):
+    headers = getattr(error, "litellm_response_headers", None)
+    if headers is None:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            date = email.utils.parsedate_to_datetime(value)
+            return max(date.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+# Function to make one rate-limited call with retries
+async def call_with_retries(provider, call, estimate_tokens=None, on_retry=None):
+    """
+    Await call() until it succeeds or fails with a non-retryable error.
+
+    Each attempt first takes one request token from the provider's bucket,
+    and estimate_tokens() tokens if a tokens-per-minute limit is set. If
+    the response has a usage block the token bucket is corrected to the
+    real count. on_retry(attempt, delay, error) is called before each
+    backoff sleep.
+    """
+    breaker = _breaker(provider)
+    attempt = 0
+    estimated_tokens = 0
+    if provider in _token_buckets and estimate_tokens:
+        estimated_tokens = estimate_tokens()
+    while True:
+        breaker.before_call(provider)
+        try:
+            if provider in _request_buckets:
+                await _request_buckets[provider].acquire(1)
+            if provider in _token_buckets and estimated_tokens:
+                await _token_buckets[provider].acquire(estimated_tokens)
+            response = await call()
+        except Exception as e:
+            if not is_retryable(e):
+                # The provider answered; the request itself was bad
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            if attempt > policy.max_retries:
+                raise
+            delay = policy.backoff(attempt, retry_after(e))
+            if on_retry:
+                on_retry(attempt, delay, e)
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancelled, e.g. the losing request of a hedge: says nothing about the provider
+            breaker.cancel_trial()
+            raise
+
+        breaker.record_success()
+        usage = getattr(response, "usage", None)
+        if usage and provider in _token_buckets and estimated_tokens:
+            _token_buckets[provider].adjust(estimated_tokens - (usage.total_tokens or 0))
+        return response
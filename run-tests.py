@@ -0,0 +1,248 @@
+"""
+Single entry point for the test suite: runs the selected tests against their
+models in one process, sharing one litellm import, one .env load and one set
+of rate limits.
+
+    python run-tests.py --list          # tests and models, without importing litellm
+    python run-tests.py --dry-run       # jobs and missing API keys, without sending anything
+    python run-tests.py basic_completion streaming --models openai/gpt-4o-mini
+    python run-tests.py --matrix nightly.toml --shard 1/4 --workers 2
+"""
+import time
+
+# Taken before the other imports so startup time includes them
+START_TIME = time.perf_counter()
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import os
+import sys
+
+import config
+import cost
+import harness
+import http_pool
+import matrix
+import metrics
+import profiler
+import response_cache
+import results
+import retry
+
+# Seconds --list and --dry-run should take from startup to finishing
+STARTUP_BUDGET = 0.25
+
+
+# Function to parse "provider=N" concurrency overrides
+def parse_limits(values):
+    limits = {}
+    for value in values or []:
+        provider, _, limit = value.partition("=")
+        limits[provider] = int(limit)
+    return limits
+
+
+# Function to report how long startup took against STARTUP_BUDGET
+def report_startup():
+    elapsed = time.perf_counter() - START_TIME
+    print(f"\nStartup: {elapsed * 1000:.0f} ms (budget {STARTUP_BUDGET * 1000:.0f} ms)")
+    if elapsed > STARTUP_BUDGET:
+        print("Warning: startup is over budget; check for slow imports with python -X importtime",
+              file=sys.stderr)
+    if "litellm" in sys.modules:
+        print("Warning: litellm was imported during startup", file=sys.stderr)
+
+
+# Function to list the tests and the models each one runs against
+def list_tests():
+    for test_name, (filename, _) in harness.TESTS.items():
+        models = ", ".join(harness.load_script(test_name).models)
+        print(f"{test_name:<22} {filename:<24} {models}")
+
+
+# Function to print the jobs a run would start and any missing API keys
+def dry_run(jobs, missing):
+    for test_name, model, *params in jobs:
+        provider = harness.provider_of(model)
+        note = f"  (missing {missing[provider]})" if provider in missing else ""
+        params = " ".join(f"{key}={value}" for key, value in (params[0] if params else {}).items())
+        print(f"{test_name:<22} {model:<40} {provider:<12} {params}{note}")
+    print(f"{len(jobs)} jobs")
+
+
+# Function to apply the retry, rate-limit and cache options (also run in matrix workers)
+def apply_settings(args):
+    retry.policy.max_retries = args.max_retries
+    if args.budget is not None:
+        # Matrix workers each get an equal share of the budget
+        cost.set_budget(args.budget / args.workers)
+    if args.cache or args.cache_replay_timing:
+        response_cache.configure(replay=args.cache_replay_timing)
+    http_pool.configure(http_pool.enabled and not args.no_pool, use_http2=args.http2, keep_alive=not args.no_keepalive,
+                        sizes=parse_limits(args.pool_size),
+                        in_flight=max([args.concurrency, *parse_limits(args.limit).values()]))
+    for provider, rpm in parse_limits(args.rpm).items():
+        retry.set_rate_limit(provider, rpm=rpm)
+    for provider, tpm in parse_limits(args.tpm).items():
+        retry.set_rate_limit(provider, tpm=tpm)
+
+
+# Function to print the --profile report and write its files
+def report_profile(profile):
+    report, report_path, folded_path = profiler.save(profile, results.RESULTS_DIR, results.RUN_ID)
+    profiler.print_report(report)
+    print(f"\nProfile written to {report_path}, flame graph stacks to {folded_path}")
+
+
+# Function to run a matrix file's jobs and write one record per job
+def run_matrix_file(args, jobs):
+    start_time = time.time()
+    with profiler.profile(args.profile_interval, args.profile_frames) if args.profile else contextlib.nullcontext() as profile:
+        job_results = matrix.run_jobs(jobs, args.workers, args.concurrency, parse_limits(args.limit),
+                                      setup=functools.partial(apply_settings, args))
+    end_time = time.time()
+    matrix.print_summary(job_results, end_time - start_time)
+    cost.print_summary()
+    http_pool.print_summary()
+    if profile:
+        report_profile(profile)
+
+    name = os.path.splitext(os.path.basename(args.matrix))[0]
+    if args.shard:
+        index, count = matrix.parse_shard(args.shard)
+        name += f"-shard{index + 1}of{count}"
+    filename = f"matrix-{name}-{results.RUN_ID}.jsonl"
+    for result in sorted(job_results, key=lambda r: r["job"]):
+        results.append_jsonl(filename, result)
+    print(f"\nResults written to {os.path.join(results.RESULTS_DIR, filename)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LiteLLM test scripts concurrently")
+    parser.add_argument("tests", nargs="*",
+                        help=f"Tests to run (default: all). One of: {', '.join(harness.TESTS)}")
+    parser.add_argument("--models", nargs="+",
+                        help="Models to test instead of each script's models list")
+    parser.add_argument("--concurrency", type=int, default=harness.DEFAULT_CONCURRENCY,
+                        help="In-flight requests allowed per provider")
+    parser.add_argument("--limit", action="append", metavar="PROVIDER=N",
+                        help="Override the concurrency for one provider, e.g. anthropic=1")
+    parser.add_argument("--rpm", action="append", metavar="PROVIDER=N",
+                        help="Requests per minute allowed for a provider, e.g. anthropic=50")
+    parser.add_argument("--tpm", action="append", metavar="PROVIDER=N",
+                        help="Tokens per minute allowed for a provider, e.g. anthropic=40000")
+    parser.add_argument("--max-retries", type=int, default=retry.policy.max_retries,
+                        help="Retries for rate-limit, overload and server errors")
+    parser.add_argument("--cache", action="store_true",
+                        help="Serve repeated requests from the on-disk response cache")
+    parser.add_argument("--cache-replay-timing", action="store_true",
+                        help="Replay cached streams with their original chunk timing")
+    parser.add_argument("--pool-size", action="append", metavar="PROVIDER=N",
+                        help="Connections kept open for a provider "
+                             f"(default: --concurrency, at least {http_pool.DEFAULT_POOL_SIZE})")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 where the provider supports it (needs h2)")
+    parser.add_argument("--no-keepalive", action="store_true",
+                        help="Open a new connection for every request, to measure the handshake overhead")
+    parser.add_argument("--no-pool", action="store_true",
+                        help="Let litellm create its own HTTP clients instead of the shared pool")
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample CPU and memory while the tests run; writes results/profile-<run id>.*")
+    parser.add_argument("--profile-interval", type=float, default=profiler.DEFAULT_INTERVAL_MS, metavar="MS",
+                        help=f"Milliseconds between profile samples (default: {profiler.DEFAULT_INTERVAL_MS})")
+    parser.add_argument("--profile-frames", type=int, default=profiler.DEFAULT_TRACE_FRAMES, metavar="N",
+                        help="Stack frames tracemalloc keeps per allocation; 0 samples only the CPU "
+                             f"(default: {profiler.DEFAULT_TRACE_FRAMES})")
+    parser.add_argument("--list", action="store_true", help="List the tests and their models, then exit")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the jobs and check API keys without sending any requests")
+    parser.add_argument("--skip-missing-keys", action="store_true",
+                        help="Skip models whose provider has no API key instead of stopping")
+    parser.add_argument("--matrix", metavar="FILE",
+                        help="Run the tests, models, params and iterations from a TOML or YAML matrix file")
+    parser.add_argument("--shard", metavar="I/N", help="With --matrix, run only shard I of N (e.g. 2/4)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="With --matrix, spread the jobs over this many processes")
+    parser.add_argument("--budget", type=float, metavar="USD",
+                        help="Stop sending requests once this much has been spent (priced by litellm)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve live OpenMetrics counters on this port while the tests run")
+    args = parser.parse_args()
+    for test_name in args.tests:
+        if test_name not in harness.TESTS:
+            parser.error(f"unknown test: {test_name}")
+    if args.matrix and (args.tests or args.models):
+        parser.error("tests and --models come from the matrix file when --matrix is given")
+    if (args.shard or args.workers > 1) and not args.matrix:
+        parser.error("--shard and --workers need --matrix")
+    if args.no_pool and (args.pool_size or args.http2 or args.no_keepalive):
+        parser.error("--pool-size, --http2 and --no-keepalive configure the shared pool; drop --no-pool")
+    if args.http2 and not http_pool.http2_available():
+        parser.error("--http2 needs the h2 package: pip install 'httpx[http2]'")
+    if args.profile and args.workers > 1:
+        parser.error("--profile only samples this process; use it without --workers")
+    if args.profile_frames < 0:
+        parser.error("--profile-frames can't be negative")
+    if args.metrics_port is not None and args.workers > 1:
+        parser.error("--metrics-port only sees jobs run in this process; use it without --workers")
+
+    if args.list:
+        list_tests()
+        report_startup()
+        return
+
+    if args.matrix:
+        try:
+            matrix_jobs = matrix.expand(matrix.load(args.matrix))
+            if args.shard:
+                matrix_jobs = matrix.shard(matrix_jobs, *matrix.parse_shard(args.shard))
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        jobs = [(job["test"], job["model"], job["params"]) for job in matrix_jobs]
+    else:
+        jobs = harness.build_jobs(args.tests or list(harness.TESTS), args.models)
+    missing = config.missing_keys(harness.provider_of(job[1]) for job in jobs)
+
+    if args.dry_run:
+        dry_run(jobs, missing)
+        report_startup()
+        sys.exit(1 if missing else 0)
+
+    if missing:
+        names = ", ".join(f"{variable} ({provider})" for provider, variable in missing.items())
+        if not args.skip_missing_keys:
+            parser.error(f"missing API keys: {names}. Set them in .env or pass --skip-missing-keys")
+        print(f"Skipping models without API keys: {names}")
+        jobs = [job for job in jobs if harness.provider_of(job[1]) not in missing]
+        if args.matrix:
+            matrix_jobs = [job for job in matrix_jobs if harness.provider_of(job["model"]) not in missing]
+
+    apply_settings(args)
+
+    # Import litellm once, before the run is timed
+    import_start = time.perf_counter()
+    harness.prepare()
+    print(f"litellm loaded in {time.perf_counter() - import_start:.2f} seconds")
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+
+    if args.matrix:
+        run_matrix_file(args, matrix_jobs)
+        return
+
+    start_time = time.time()
+    with profiler.profile(args.profile_interval, args.profile_frames) if args.profile else contextlib.nullcontext() as profile:
+        results = asyncio.run(harness.run_matrix(jobs, args.concurrency, parse_limits(args.limit)))
+    end_time = time.time()
+
+    harness.print_summary(results, end_time - start_time)
+    cost.print_summary()
+    http_pool.print_summary()
+    if profile:
+        report_profile(profile)
+
+
+# Run the selected tests against their models
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Streaming response consumer with a small, fixed cost per chunk.
+
+StreamConsumer reads a litellm stream once. Text deltas are appended to one
+list that is joined only at the end, streamed tool-call argument fragments
+are put back together per call, and the usage block is kept. litellm keeps
+most chunk fields as pydantic "extra" fields, where attribute access (and
+so hasattr()) goes through BaseModel.__getattr__ and costs microseconds, so
+the chunk loop reads them straight from the field dicts. Output is echoed
+in one of three modes:
+
+    "tokens"   print each delta as it arrives
+    "batched"  print every FLUSH_CHUNKS deltas and at the end (default)
+    "off"      print nothing (benchmark.py and loadgen.py use this)
+
+Tool-call arguments are scanned as their fragments arrive, so on_tool_call
+can be handed each call the moment its arguments form a complete JSON
+object, before the rest of the stream has arrived.
+
+fan_out() consumes many streams concurrently on one event loop. Each
+stream is pulled only as fast as its consumer reads it, and a semaphore
+bounds how many are open at once.
+
+    python stream_consumer.py overhead --chunks 200000
+    python stream_consumer.py fan-out --model mock/openai/default --streams 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import re
+import sys
+import time
+
+from latency import StreamTimer, percentile
+
+# Echo modes, and how many deltas "batched" collects before printing
+ECHO_MODES = ("tokens", "batched", "off")
+FLUSH_CHUNKS = 32
+
+echo_mode = "batched"
+
+# Characters that change the nesting or string state of JSON text
+_JSON_SPECIAL = re.compile(r'[{}\[\]"\\]')
+
+
+# Function to pick how streamed text is echoed
+def set_echo(mode):
+    global echo_mode
+    if mode not in ECHO_MODES:
+        raise ValueError(f"echo mode must be one of {', '.join(ECHO_MODES)}, not {mode}")
+    echo_mode = mode
+
+
+def _fields(obj):
+    """The dict holding obj's stream fields: its pydantic extra fields if it has any, else __dict__"""
+    return getattr(obj, "__pydantic_extra__", None) or obj.__dict__
+
+
+def _get(obj, name):
+    """obj.name or None, read from the object's field dicts instead of through __getattr__"""
+    value = obj.__dict__.get(name)
+    if value is None:
+        extra = getattr(obj, "__pydantic_extra__", None)
+        if extra:
+            value = extra.get(name)
+    return value
+
+
+def _write(text):
+    # sys.stdout is looked up each time so harness.captured_output() still applies
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+class JsonObjectScanner:
+    """
+    Tell when streamed fragments of a JSON object add up to the whole
+    object. Only brackets, quotes and backslashes are looked at, so each
+    fragment is scanned once and nothing is parsed until it is complete.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.complete = False
+
+    def feed(self, text):
+        """Scan the next fragment and return whether the object is complete"""
+        if self.complete:
+            return True
+        # A backslash at the end of the last fragment escapes this one's first character
+        skip = 0 if self.escaped else -1
+        self.escaped = False
+        for match in _JSON_SPECIAL.finditer(text):
+            position = match.start()
+            if position == skip:
+                continue
+            char = text[position]
+            if self.in_string:
+                if char == "\\":
+                    skip = position + 1
+                    self.escaped = skip == len(text)
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete = True
+                    return True
+        return False
+
+
+class StreamResult:
+    """The text, tool calls, usage and timings of one consumed stream"""
+
+    def __init__(self, text, tool_calls, usage, finish_reason, chunks, stats):
+        self.text = text
+        self.tool_calls = tool_calls
+        self.usage = usage
+        self.finish_reason = finish_reason
+        self.chunks = chunks
+        self.stats = stats
+
+
+class StreamConsumer:
+    """
+    Read a stream into a StreamResult.
+
+    timer, if given, should already be started; it is marked on every chunk
+    that carries text or tool-call arguments and stopped at the end of the
+    stream. echo defaults to the module's echo_mode. on_tool_call, if given,
+    is called with each tool call ({"id", "name", "arguments"}) as soon as
+    its arguments are complete, or at the end of the stream for calls whose
+    arguments never formed a complete object.
+    """
+
+    def __init__(self, timer=None, echo=None, flush_chunks=FLUSH_CHUNKS, on_tool_call=None):
+        self.timer = timer
+        self.echo = echo or echo_mode
+        self.flush_chunks = flush_chunks
+        self.on_tool_call = on_tool_call
+
+    async def consume(self, stream):
+        parts = []
+        append = parts.append
+        mark = self.timer.mark if self.timer else None
+        echo_tokens = self.echo == "tokens"
+        flush_chunks = self.flush_chunks if self.echo == "batched" else 0
+        echoed = 0
+        calls = {}
+        usage = None
+        finish_reason = None
+        chunks = 0
+
+        async for chunk in stream:
+            chunks += 1
+            choices = chunk.choices
+            if choices:
+                choice = _fields(choices[0])
+                delta = _fields(choice["delta"])
+                content = delta.get("content")
+                tool_deltas = delta.get("tool_calls")
+                if content:
+                    if mark:
+                        mark()
+                    append(content)
+                    if echo_tokens:
+                        _write(content)
+                    elif flush_chunks and len(parts) - echoed >= flush_chunks:
+                        _write("".join(parts[echoed:]))
+                        echoed = len(parts)
+                if tool_deltas:
+                    if mark and not content:
+                        mark()
+                    self._add_tool_fragments(calls, tool_deltas)
+                reason = choice.get("finish_reason")
+                if reason:
+                    finish_reason = reason
+            chunk_usage = _get(chunk, "usage")
+            if chunk_usage:
+                usage = chunk_usage
+
+        if self.timer:
+            self.timer.stop()
+        if flush_chunks and echoed < len(parts):
+            _write("".join(parts[echoed:]))
+        tool_calls = [self._finish_call(call) for _, call in sorted(calls.items())]
+        stats = self.timer.summary(usage.completion_tokens if usage else None) if self.timer else None
+        return StreamResult("".join(parts), tool_calls, usage, finish_reason, chunks, stats)
+
+    def _finish_call(self, call):
+        """Return the finished call, passing it to on_tool_call first if that hasn't happened yet"""
+        finished = {"id": call["id"], "name": call["name"], "arguments": "".join(call["arguments"])}
+        if self.on_tool_call and not call["dispatched"]:
+            call["dispatched"] = True
+            self.on_tool_call(finished)
+        return finished
+
+    def _add_tool_fragments(self, calls, tool_deltas):
+        """Add streamed tool-call pieces to calls ({index: {"id", "name", "arguments": [fragments], ...}})"""
+        for tool_delta in tool_deltas:
+            index = _get(tool_delta, "index") or 0
+            call = calls.get(index)
+            if call is None:
+                call = calls[index] = {"id": None, "name": None, "arguments": [],
+                                       "scanner": JsonObjectScanner(), "dispatched": False}
+            call_id = _get(tool_delta, "id")
+            if call_id:
+                call["id"] = call_id
+            function = _get(tool_delta, "function")
+            if function is not None:
+                name = _get(function, "name")
+                if name:
+                    call["name"] = name
+                arguments = _get(function, "arguments")
+                if arguments:
+                    call["arguments"].append(arguments)
+                    if self.on_tool_call and call["scanner"].feed(arguments):
+                        self._finish_call(call)
+
+
+# Function to consume many streams concurrently on the running event loop
+async def fan_out(open_stream, count, concurrency=None):
+    """
+    Call open_stream(index) for index in range(count) (a coroutine that
+    returns a stream) and consume each stream without echo, at most
+    concurrency at a time. Returns a StreamResult or the exception raised,
+    per index.
+    """
+    limit = asyncio.Semaphore(concurrency) if concurrency else contextlib.nullcontext()
+
+    async def one(index):
+        async with limit:
+            timer = StreamTimer()
+            timer.start()
+            stream = await open_stream(index)
+            return await StreamConsumer(timer, echo="off").consume(stream)
+
+    return await asyncio.gather(*(one(index) for index in range(count)), return_exceptions=True)
+
+
+# --- per-chunk overhead micro-benchmark ---
+
+def _sample_chunks(count):
+    import litellm
+    from litellm.types.utils import Delta, StreamingChoices
+    return [litellm.ModelResponseStream(choices=[StreamingChoices(delta=Delta(content=f" t{index % 10}"))])
+            for index in range(count)]
+
+
+async def _replay(chunks, repeats):
+    for _ in range(repeats):
+        for chunk in chunks:
+            yield chunk
+
+
+async def _bare_loop(stream):
+    async for _ in stream:
+        pass
+
+
+async def _hasattr_loop(stream, output):
+    """The per-chunk checks streaming-test.py used before StreamConsumer"""
+    timer = StreamTimer()
+    mark = timer.mark
+    timer.start()
+    async for chunk in stream:
+        if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
+            if hasattr(chunk.choices[0], 'delta') and hasattr(chunk.choices[0].delta, 'content'):
+                content = chunk.choices[0].delta.content
+                if content:
+                    mark()
+                    print(content, end="", flush=True, file=output)
+        if getattr(chunk, 'usage', None):
+            pass
+    timer.stop()
+    timer.summary()
+
+
+# Function to measure the cost per chunk of each way of reading a stream
+def measure_overhead(total_chunks, distinct=1000):
+    """Return {variant: nanoseconds per chunk} over the cost of bare iteration"""
+    chunks = _sample_chunks(distinct)
+    repeats = max(total_chunks // distinct, 1)
+    total = repeats * len(chunks)
+
+    def timed(make_loop):
+        started = time.perf_counter_ns()
+        asyncio.run(make_loop(_replay(chunks, repeats)))
+        return time.perf_counter_ns() - started
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        bare = timed(_bare_loop)
+        variants = {"hasattr loop, print per token": timed(lambda stream: _hasattr_loop(stream, devnull))}
+        for mode in ECHO_MODES:
+            async def consume(stream, mode=mode):
+                timer = StreamTimer()
+                timer.start()
+                await StreamConsumer(timer, echo=mode).consume(stream)
+            variants[f"StreamConsumer, echo {mode}"] = timed(consume)
+    return {name: (elapsed - bare) / total for name, elapsed in variants.items()}, bare / total
+
+
+async def _fan_out_benchmark(model, streams, concurrency, max_tokens):
+    import harness
+
+    async def open_stream(index):
+        return await harness.acompletion(
+            model=model,
+            messages=[{"role": "user", "content": f"Write a short poem about artificial intelligence ({index})."}],
+            stream=True,
+            stream_options={"include_usage": True},
+            max_tokens=max_tokens
+        )
+
+    started = time.perf_counter()
+    outcomes = await fan_out(open_stream, streams, concurrency)
+    return outcomes, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cost of consuming streamed responses")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    overhead = subcommands.add_parser("overhead", help="Per-chunk overhead of each consumer, without a network")
+    overhead.add_argument("--chunks", type=int, default=200_000, help="Chunks per variant (default: 200000)")
+    many = subcommands.add_parser("fan-out", help="Consume many concurrent streams on one event loop")
+    many.add_argument("--model", default="mock/openai/default", help="Model to stream from (default: mock/openai/default)")
+    many.add_argument("--streams", type=int, default=100, help="Number of streams (default: 100)")
+    many.add_argument("--concurrency", type=int, help="Streams open at once (default: all of them)")
+    many.add_argument("--max-tokens", type=int, default=500, help="max_tokens for each response")
+    args = parser.parse_args()
+
+    import harness
+    import http_pool
+    harness.prepare()
+    if args.command == "overhead":
+        per_chunk, bare = measure_overhead(args.chunks)
+        print(f"Per-chunk overhead over bare iteration ({bare:.0f} ns/chunk), {args.chunks} chunks:")
+        for name, ns in per_chunk.items():
+            print(f"  {name:<32} {ns:>8.0f} ns/chunk")
+        return
+
+    # Give every open stream its own connection, so the pool doesn't cap the fan-out
+    http_pool.configure(http_pool.enabled, in_flight=args.concurrency or args.streams)
+    outcomes, elapsed = asyncio.run(_fan_out_benchmark(args.model, args.streams, args.concurrency, args.max_tokens))
+    done = [o for o in outcomes if isinstance(o, StreamResult)]
+    errors = len(outcomes) - len(done)
+    chunks = sum(result.chunks for result in done)
+    ttfts = [result.stats["ttft_ms"] for result in done if result.stats["ttft_ms"] is not None]
+    print(f"{len(done)} streams ({errors} failed) in {elapsed:.2f} seconds: {chunks / elapsed:,.0f} chunks/sec")
+    if ttfts:
+        print(f"Time to first token: p50 {percentile(ttfts, 50):.0f} ms, p95 {percentile(ttfts, 95):.0f} ms, "
+              f"max {max(ttfts):.0f} ms")
+    http_pool.print_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,8 @@
-import os
-import time
-import litellm
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Set API keys
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-os.environ["ANTHROPIC_API_KEY"] = os.getenv("ANTHROPIC_API_KEY")
+import asyncio
+import harness
+import latency
+import results
+import stream_consumer
 
 # Define models to test
 models = [
@@ -20,7 +14,7 @@ models = [
 user_message = "Write a short poem about artificial intelligence."
 
 # Function to test streaming
-def test_streaming(model):
+async def test_streaming(model, **params):
     """Test streaming for a given model"""
     print(f"\n=== Testing Streaming for {model} ===")
     
@@ -28,36 +22,50 @@ def test_streaming(model):
     user_message = "Write a short poem about artificial intelligence."
     
     try:
-        # Measure time manually
-        start_time = time.time()
+        # Per-chunk timestamps are taken with perf_counter_ns
+        timer = latency.StreamTimer()
         
         print(f"Streaming response:")
         
-        response = litellm.completion(
+        timer.start()
+        response = await harness.acompletion(
             model=model,
             messages=[{"role": "user", "content": user_message}],
             stream=True,
-            max_tokens=50  # Limit to 50 tokens for quick testing
+            stream_options={"include_usage": True},
+            max_tokens=params.pop("max_tokens", 50),  # Limit to 50 tokens for quick testing
+            **params
         )
         
-        # Process streaming response
-        for chunk in response:
-            if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
-                if hasattr(chunk.choices[0], 'delta') and hasattr(chunk.choices[0].delta, 'content'):
-                    content = chunk.choices[0].delta.content
-                    if content:
-                        print(content, end="", flush=True)
+        # Process streaming response (echoed in batches, or not at all in benchmark mode)
+        stream = await stream_consumer.StreamConsumer(timer).consume(response)
         
-        end_time = time.time()
+        # Record the chunk timings
+        stats = stream.stats
+        results.append_jsonl("streaming.jsonl", dict(stats, model=model, test="streaming"))
         
         print("\n")
-        print(f"Time taken: {end_time - start_time:.2f} seconds")
+        if stats["ttft_ms"] is not None:
+            print(f"Time to first token: {stats['ttft_ms']:.0f} ms")
+        if stats["inter_chunk_p50_ms"] is not None:
+            print(f"Inter-chunk latency: p50 {stats['inter_chunk_p50_ms']:.1f} ms, "
+                  f"p95 {stats['inter_chunk_p95_ms']:.1f} ms, p99 {stats['inter_chunk_p99_ms']:.1f} ms")
+        if stats["tokens_per_sec"]:
+            print(f"Throughput: {stats['tokens_per_sec']:.1f} tokens/sec over {stats['chunks']} chunks")
+        print(f"Time taken: {stats['total_ms'] / 1000:.2f} seconds")
         print("Test passed successfully!")
+        return dict(stats, ok=True, latency=stats["total_ms"] / 1000)
         
     except Exception as e:
         print(f"Error testing {model}: {str(e)}")
+        return {"ok": False, "error": str(e), "error_type": type(e).__name__}
 
 # Run test for each model
-if __name__ == "__main__":
+async def main():
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
     for model in models:
-        test_streaming(model)
\ No newline at end of file
+        await test_streaming(model)
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -1,14 +1,6 @@
-import os
 import time
-import litellm
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Set API keys
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-os.environ["ANTHROPIC_API_KEY"] = os.getenv("ANTHROPIC_API_KEY")
+import asyncio
+import harness
 
 # Define models to test
 models = [
@@ -16,25 +8,26 @@ models = [
     "anthropic/claude-3-5-sonnet-latest"
 ]
 
+# System message test
+system_message = "You are a pirate. Always respond like a pirate, saying 'Arr' and using pirate slang."
+user_message = "What's the weather like today?"
+
 # Function to test system message
-def test_system_message(model):
+async def test_system_message(model, **params):
     """Test system message handling for a given model"""
     print(f"\n=== Testing System Message for {model} ===")
     
-    # System message test
-    system_message = "You are a pirate. Always respond like a pirate, saying 'Arr' and using pirate slang."
-    user_message = "What's the weather like today?"
-    
     try:
         # Measure time manually
         start_time = time.time()
         
-        response = litellm.completion(
+        response = await harness.acompletion(
             model=model,
             messages=[
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": user_message}
-            ]
+            ],
+            **params
         )
         
         end_time = time.time()
@@ -42,11 +35,18 @@ def test_system_message(model):
         print(f"Response: {response.choices[0].message.content}")
         print(f"Time taken: {end_time - start_time:.2f} seconds")
         print("Test passed successfully!")
+        return {"ok": True, "latency": end_time - start_time}
         
     except Exception as e:
         print(f"Error testing {model}: {str(e)}")
+        return {"ok": False, "error": str(e), "error_type": type(e).__name__}
 
 # Run test for each model
-if __name__ == "__main__":
+async def main():
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
     for model in models:
-        test_system_message(model)
\ No newline at end of file
+        await test_system_message(model)
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
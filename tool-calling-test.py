@@ -1,16 +1,9 @@
-import os
 import time
-import litellm
-import json
-import random
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Set API keys
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-os.environ["ANTHROPIC_API_KEY"] = os.getenv("ANTHROPIC_API_KEY")
+import asyncio
+import harness
+import latency
+import stream_consumer
+import tool_dispatch
 
 # Define models to test (models that support tool calling)
 models = [
@@ -68,163 +61,122 @@ def get_weather(location, unit="celsius"):
         "humidity": f"{city_data['humidity']}%"
     }
 
+# Tools the model can call, run concurrently by tool_dispatch
+registry = tool_dispatch.ToolRegistry()
+registry.register(get_weather)
+
 # Function to test tool calling
-def test_tool_calling(model):
-    """Test tool calling for a given model"""
+async def test_tool_calling(model, **params):
+    """Test tool calling for a given model, running every tool call the model makes"""
     print(f"\n=== Testing Tool Calling for {model} ===")
     
     # User message for tool calling test
     user_message = "What's the weather like in San Francisco today?"
     
-    # Retry logic with exponential backoff
-    max_retries = 5
-    retry_count = 0
-    backoff_time = 2  # Start with 2 seconds
+    # Retries with backoff are handled by harness.acompletion
+    try:
+        # Measure time manually
+        start_time = time.time()
+        
+        response, turns = await tool_dispatch.run_tool_loop(
+            model,
+            [{"role": "user", "content": user_message}],
+            tools,
+            registry,
+            tool_choice=params.pop("tool_choice", "auto"),
+            **params
+        )
+        
+        end_time = time.time()
+        
+        # Print the final response and the latency breakdown
+        print(f"Final response: {response.choices[0].message.content}")
+        model_time = sum(turn["model_latency"] for turn in turns)
+        tool_time = sum(turn.get("tools_latency", 0) for turn in turns)
+        tool_count = sum(turn["tool_calls"] for turn in turns)
+        print(f"Model time: {model_time:.2f} seconds over {len(turns)} turn(s)")
+        print(f"Tool time: {tool_time * 1000:.1f} ms for {tool_count} tool call(s)")
+        print(f"Total time taken: {end_time - start_time:.2f} seconds")
+        print("Test passed successfully!")
+        return {"ok": True, "latency": end_time - start_time, "model_time": model_time, "tool_time": tool_time,
+                "turns": turns}
+        
+    except Exception as e:
+        print(f"Error testing {model}: {str(e)}")
+        return {"ok": False, "error": str(e), "error_type": type(e).__name__}
+
+# Function to test streamed tool calling, running each tool as soon as its arguments arrive
+async def test_streaming_tool_calling(model, **params):
+    """Stream a tool-calling response and dispatch each tool call before the stream ends"""
+    print(f"\n=== Testing Streaming Tool Calling for {model} ===")
     
-    while retry_count < max_retries:
-        try:
-            # Measure time manually
-            start_time = time.time()
-            
-            response = litellm.completion(
-                model=model,
-                messages=[{"role": "user", "content": user_message}],
-                tools=tools,
-                tool_choice="auto"
-            )
-            
-            mid_time = time.time()
-            
-            # Print the initial response
-            content = response.choices[0].message.content
-            tool_calls = response.choices[0].message.tool_calls
-            
-            print(f"Initial response: {content}")
-            
-            # Handle tool_calls serialization
-            if tool_calls:
-                # Convert tool_calls to a serializable format for display
-                serializable_tool_calls = []
-                for call in tool_calls:
-                    serializable_call = {
-                        "id": call.id,
-                        "type": call.type,
-                        "function": {
-                            "name": call.function.name,
-                            "arguments": call.function.arguments
-                        }
-                    }
-                    serializable_tool_calls.append(serializable_call)
-                print(f"Tool calls: {json.dumps(serializable_tool_calls, indent=2)}")
-            else:
-                print("Tool calls: None")
-                
-            print(f"Initial API call time: {mid_time - start_time:.2f} seconds")
-            
-            # If there are tool calls, process them
-            if tool_calls:
-                # In a real application, you would execute the actual function
-                # Here we'll simulate with our get_weather function
-                tool_call = tool_calls[0]
-                function_name = tool_call.function.name
-                
-                if function_name == "get_weather":
-                    # Parse arguments
-                    args = json.loads(tool_call.function.arguments)
-                    location = args.get("location", "San Francisco, CA")
-                    unit = args.get("unit", "celsius")
-                    
-                    # Get weather data
-                    weather_result = get_weather(location, unit)
-                    
-                    # Call the model again with the tool results
-                    print("\nCalling model with tool results...")
-                    
-                    # Second API call with retry logic
-                    inner_retry_count = 0
-                    inner_backoff_time = 2
-                    
-                    while inner_retry_count < max_retries:
-                        try:
-                            tool_start_time = time.time()
-                            
-                            # Convert tool_calls to the format expected by litellm for the second request
-                            assistant_message = {
-                                "role": "assistant",
-                                "content": content if content else None
-                            }
-                            
-                            # Add tool_calls to the assistant message if they exist
-                            if tool_calls:
-                                # We need to pass the raw tool_calls object here, not the serialized version
-                                assistant_message["tool_calls"] = tool_calls
-                            
-                            second_response = litellm.completion(
-                                model=model,
-                                messages=[
-                                    {"role": "user", "content": user_message},
-                                    assistant_message,
-                                    {
-                                        "role": "tool",
-                                        "tool_call_id": tool_call.id,
-                                        "name": function_name,
-                                        "content": json.dumps(weather_result)
-                                    }
-                                ],
-                                tools=tools if 'anthropic' in model else None  # Include tools for Anthropic
-                            )
-                            
-                            tool_end_time = time.time()
-                            
-                            # Print the final response
-                            final_response = second_response.choices[0].message.content
-                            print(f"Final response: {final_response}")
-                            print(f"Second API call time: {tool_end_time - tool_start_time:.2f} seconds")
-                            break  # Success, exit retry loop
-                            
-                        except Exception as e:
-                            inner_retry_count += 1
-                            error_msg = str(e)
-                            
-                            # Check if it's an overloaded error
-                            if "overloaded" in error_msg.lower() and inner_retry_count < max_retries:
-                                jitter = random.uniform(0, 0.5)  # Add some randomness
-                                wait_time = inner_backoff_time + jitter
-                                print(f"Service overloaded during second call. Retrying in {wait_time:.2f} seconds... (Attempt {inner_retry_count}/{max_retries})")
-                                time.sleep(wait_time)
-                                inner_backoff_time *= 2  # Exponential backoff
-                            else:
-                                if inner_retry_count >= max_retries:
-                                    print(f"Max retries ({max_retries}) reached for second call. Giving up.")
-                                print(f"Error in second API call: {error_msg}")
-                                break
-            
-            end_time = time.time()
-            print(f"Total time taken: {end_time - start_time:.2f} seconds")
-            print("Test passed successfully!")
-            break  # Success, exit main retry loop
-            
-        except Exception as e:
-            retry_count += 1
-            error_msg = str(e)
-            
-            # Check if it's an overloaded error
-            if "overloaded" in error_msg.lower() and retry_count < max_retries:
-                jitter = random.uniform(0, 0.5)  # Add some randomness
-                wait_time = backoff_time + jitter
-                print(f"Service overloaded. Retrying in {wait_time:.2f} seconds... (Attempt {retry_count}/{max_retries})")
-                time.sleep(wait_time)
-                backoff_time *= 2  # Exponential backoff
-            else:
-                if retry_count >= max_retries:
-                    print(f"Max retries ({max_retries}) reached. Giving up.")
-                print(f"Error testing {model}: {error_msg}")
-                break
+    # User message for tool calling test
+    user_message = "What's the weather like in San Francisco today?"
+    messages = [{"role": "user", "content": user_message}]
+    
+    try:
+        timer = latency.StreamTimer()
+        dispatched = []
+        
+        # Called by the consumer the moment a call's arguments form a complete JSON object
+        def dispatch(call):
+            tool_call = tool_dispatch.make_tool_call(call)
+            dispatch_ms = (time.perf_counter_ns() - timer.start_ns) / 1e6
+            dispatched.append((tool_call, dispatch_ms, asyncio.ensure_future(registry.execute(tool_call))))
+            print(f"Dispatched {call['name']} ({call['id']}) at {dispatch_ms:.0f} ms")
+        
+        timer.start()
+        response = await harness.acompletion(
+            model=model,
+            messages=messages,
+            tools=tools,
+            stream=True,
+            stream_options={"include_usage": True},
+            tool_choice=params.pop("tool_choice", "auto"),
+            **params
+        )
+        stream = await stream_consumer.StreamConsumer(timer, on_tool_call=dispatch).consume(response)
+        stream_end_ms = stream.stats["total_ms"]
+        print(f"Stream ended at {stream_end_ms:.0f} ms with {len(stream.tool_calls)} tool call(s)")
+        if not dispatched:
+            raise ValueError("The model did not call any tools")
+        
+        # Collect the tool results, which may have finished before the stream did
+        outcomes = await asyncio.gather(*(task for _, _, task in dispatched))
+        tools_done_ms = (time.perf_counter_ns() - timer.start_ns) / 1e6
+        calls = []
+        for (tool_call, dispatch_ms, _), (tool_message, timing) in zip(dispatched, outcomes):
+            lead_ms = stream_end_ms - dispatch_ms
+            calls.append(dict(timing, dispatch_ms=dispatch_ms, lead_ms=lead_ms))
+            status = "ok" if timing["ok"] else f"failed: {tool_message['content']}"
+            print(f"  {timing['name']} ({timing['id']}): dispatched {lead_ms:.0f} ms before the stream ended, "
+                  f"ran {timing['latency'] * 1000:.1f} ms, {status}")
+        
+        # Send the results back for the final answer
+        messages.append({"role": "assistant", "content": stream.text or None,
+                         "tool_calls": [tool_call for tool_call, _, _ in dispatched]})
+        messages.extend(tool_message for tool_message, _ in outcomes)
+        final = await harness.acompletion(model=model, messages=messages, tools=tools, **params)
+        
+        print(f"Final response: {final.choices[0].message.content}")
+        print(f"Time to first tool dispatch: {dispatched[0][1]:.0f} ms, time to stream end: {stream_end_ms:.0f} ms")
+        print(f"All tool results ready at {tools_done_ms:.0f} ms")
+        print("Test passed successfully!")
+        return {"ok": True, "latency": (time.perf_counter_ns() - timer.start_ns) / 1e9,
+                "tool_dispatch_ms": dispatched[0][1], "stream_end_ms": stream_end_ms,
+                "tools_done_ms": tools_done_ms, "tool_calls": calls}
+        
+    except Exception as e:
+        print(f"Error testing {model}: {str(e)}")
+        return {"ok": False, "error": str(e), "error_type": type(e).__name__}
 
 # Run test for each model
-if __name__ == "__main__":
+async def main():
+    # Load .env and import litellm before anything is timed
+    harness.prepare()
     for model in models:
-        test_tool_calling(model)
-        # Add delay between models to avoid overloading
-        if model != models[-1]:  # If not the last model
-            time.sleep(2)  # Wait 2 seconds between model tests
\ No newline at end of file
+        await test_tool_calling(model)
+        await test_streaming_tool_calling(model)
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
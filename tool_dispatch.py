@@ -0,0 +1,140 @@
+"""
+Tool dispatch for the tool-calling tests.
+
+Runs every tool call a model returns concurrently: plain functions run in a
+thread pool and async functions on the event loop, each with its own
+timeout. run_tool_loop() keeps calling the model with the tool results
+until it stops asking for tools and records how long each turn and each
+tool took. For streamed responses, make_tool_call() turns a call collected
+by stream_consumer into the same object, so it can be executed while the
+rest of the stream is still arriving.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import harness
+
+# Seconds a tool may run before its call is answered with a timeout error
+DEFAULT_TOOL_TIMEOUT = 10.0
+
+
+class ToolRegistry:
+    """Functions the model may call, looked up by name"""
+
+    def __init__(self, max_workers=8, timeout=DEFAULT_TOOL_TIMEOUT):
+        self.tools = {}
+        self.timeouts = {}
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._executor = None
+
+    def register(self, func=None, name=None, timeout=None):
+        """Register func under name (default: its __name__); usable as a decorator"""
+        if func is None:
+            return functools.partial(self.register, name=name, timeout=timeout)
+        name = name or func.__name__
+        self.tools[name] = func
+        if timeout is not None:
+            self.timeouts[name] = timeout
+        return func
+
+    def _run(self, func, arguments):
+        if inspect.iscoroutinefunction(func):
+            return func(**arguments)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="tool")
+        return asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, **arguments))
+
+    async def execute(self, tool_call):
+        """
+        Run one tool call and return (tool message, timing). Errors, bad
+        arguments and timeouts are reported back to the model in the tool
+        message rather than raised.
+        """
+        name = tool_call.function.name
+        timeout = self.timeouts.get(name, self.timeout)
+        start_time = time.perf_counter()
+        try:
+            if name not in self.tools:
+                raise KeyError(f"Unknown tool: {name}")
+            arguments = json.loads(tool_call.function.arguments or "{}")
+            result = await asyncio.wait_for(self._run(self.tools[name], arguments), timeout)
+            content, ok = json.dumps(result), True
+        except asyncio.TimeoutError:
+            content, ok = json.dumps({"error": f"{name} timed out after {timeout} seconds"}), False
+        except Exception as e:
+            content, ok = json.dumps({"error": f"{type(e).__name__}: {e}"}), False
+        latency = time.perf_counter() - start_time
+
+        message = {"role": "tool", "tool_call_id": tool_call.id, "name": name, "content": content}
+        return message, {"name": name, "id": tool_call.id, "ok": ok, "latency": latency}
+
+    async def execute_all(self, tool_calls):
+        """Run all tool calls concurrently; results keep the order of tool_calls"""
+        return await asyncio.gather(*(self.execute(call) for call in tool_calls))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# Function to turn a tool call collected from a stream into litellm's tool call object
+def make_tool_call(call):
+    """call is a {"id", "name", "arguments"} dict from stream_consumer.StreamConsumer"""
+    from litellm.types.utils import ChatCompletionMessageToolCall, Function
+    return ChatCompletionMessageToolCall(id=call["id"], type="function",
+                                         function=Function(name=call["name"], arguments=call["arguments"] or "{}"))
+
+
+# Function to serialize tool calls for printing
+def describe_tool_calls(tool_calls):
+    return json.dumps([
+        {"id": call.id, "type": call.type,
+         "function": {"name": call.function.name, "arguments": call.function.arguments}}
+        for call in tool_calls
+    ], indent=2)
+
+
+# Function to run the model/tool loop until the model stops calling tools
+async def run_tool_loop(model, messages, tools, registry, max_turns=5, **kwargs):
+    """
+    Call the model, run any tool calls it makes, send back the results and
+    repeat, for at most max_turns model calls. Returns the final response
+    and a list of turns with the model latency and per-tool timings.
+    """
+    messages = list(messages)
+    turns = []
+    response = None
+    for turn in range(1, max_turns + 1):
+        start_time = time.perf_counter()
+        response = await harness.acompletion(model=model, messages=messages, tools=tools, **kwargs)
+        model_latency = time.perf_counter() - start_time
+
+        message = response.choices[0].message
+        tool_calls = message.tool_calls or []
+        record = {"turn": turn, "model_latency": model_latency, "tool_calls": len(tool_calls), "tools": []}
+        turns.append(record)
+        print(f"Turn {turn}: {model_latency:.2f}s, {len(tool_calls)} tool call(s)")
+        if not tool_calls:
+            break
+        print(f"Tool calls: {describe_tool_calls(tool_calls)}")
+
+        # The raw tool_calls objects are passed back, not the serialized version
+        messages.append({"role": "assistant", "content": message.content or None, "tool_calls": tool_calls})
+        start_time = time.perf_counter()
+        outcomes = await registry.execute_all(tool_calls)
+        record["tools_latency"] = time.perf_counter() - start_time
+        for tool_message, timing in outcomes:
+            messages.append(tool_message)
+            record["tools"].append(timing)
+            status = "ok" if timing["ok"] else f"failed: {tool_message['content']}"
+            print(f"  {timing['name']} ({timing['id']}): {timing['latency'] * 1000:.1f} ms, {status}")
+    else:
+        print(f"Stopped after {max_turns} turns; the model was still calling tools")
+
+    return response, turns